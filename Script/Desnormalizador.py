@@ -1,44 +1,84 @@
 from pathlib import Path
+from dataclasses import replace as replace_node
 import argparse
 import zipfile
 import sys
+import time
 import pandas as pd
 
+from schemas import RAW_SCHEMAS, STAGING_CONTRACTS, STAGING_SCHEMAS, apply_schema, is_timestamp, raw_columns, report_memory
+from storage import CSV_CODECS, FORMATS, TableWriter, compressed_output, compression, csv_source, output_path, read_table, table_path, write_table
+from build_cache import CACHE_FILE, BuildCache, options_salt
+from executor import Node, run_dag
+from instrumentation import MANIFEST_FILE, file_bytes, profiled, run_manifest, step
+from validation import NATURAL_KEYS, KeySet, Validator, parents_of, quarantine, rule_columns, valid_keys
+from incremental import RAW_WATERMARKS, STATE_FILE, high_water, load_state, newer_than, save_state, upsert_table
 
 RAW_DIR = Path(__file__).resolve().parents[1] / "raw"
 STAGING_DIR = Path(__file__).resolve().parents[1] / "STAGING"
 STAGING_DIR.mkdir(parents=True, exist_ok=True)
 
 
-from pathlib import Path
-import argparse
-import zipfile
-import sys
-import pandas as pd
-
-RAW_DIR = Path(__file__).resolve().parents[1] / "raw"
-STAGING_DIR = Path(__file__).resolve().parents[1] / "STAGING"
-STAGING_DIR.mkdir(parents=True, exist_ok=True)
-
-
-def load(name, raw_dir: Path = RAW_DIR):
-    path = raw_dir / f"{name}.csv"
+def load(name, raw_dir: Path = RAW_DIR, columns=None, memory_report: bool = False):
+    path = table_path(raw_dir, name, "csv")
     if not path.exists():
         print(f"⚠️  Warning: {path} not found. Returning empty DataFrame.")
         return pd.DataFrame()
     try:
-        return pd.read_csv(path)
+        df = read_table(raw_dir, name, "csv", columns=columns, schema=RAW_SCHEMAS.get(name))
+        if memory_report:
+            report_memory(name, read_table(raw_dir, name, "csv", columns=columns), df)
+        return df
     except Exception as e:
         print(f"❌ Error reading {path}: {e}")
         raise
 
 
-def save(df: pd.DataFrame, name: str, staging_dir: Path = STAGING_DIR):
-    out = staging_dir / f"{name}.csv"
-    df.to_csv(out, index=False)
+def load_chunks(name, raw_dir: Path = RAW_DIR, chunk_rows: int = 100_000, columns=None):
+    path = table_path(raw_dir, name, "csv")
+    if not path.exists():
+        print(f"⚠️  Warning: {path} not found. Nothing to stream.")
+        return
+    schema = RAW_SCHEMAS.get(name, {})
+    dtypes = {c: t for c, t in schema.items() if not is_timestamp(t)}
+    usecols = (lambda c: c in set(columns)) if columns is not None else None
+    try:
+        # The step spans the whole stream, so its wall time includes the
+        # consumer's work between chunks; read_s is the time spent parsing.
+        with step("read_chunks", name, format="csv", bytes_read=file_bytes(path)) as record, csv_source(path) as source, pd.read_csv(source, chunksize=chunk_rows, dtype=dtypes, usecols=usecols) as reader:
+            record.update(rows_out=0, chunks=0, read_s=0.0)
+            chunks = iter(reader)
+            while True:
+                started = time.perf_counter()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    chunk = apply_schema(chunk, schema)
+                record["read_s"] = round(record["read_s"] + time.perf_counter() - started, 6)
+                if chunk is None:
+                    break
+                record["rows_out"] += len(chunk)
+                record["chunks"] += 1
+                yield chunk
+    except Exception as e:
+        print(f"❌ Error reading {path}: {e}")
+        raise
+
+
+def save(df: pd.DataFrame, name: str, staging_dir: Path = STAGING_DIR, fmt: str = "csv"):
+    out = write_table(df, staging_dir, name, fmt, STAGING_SCHEMAS.get(name))
     print(f"Saved: {out}")
 
 
+def save_chunks(chunks, name: str, staging_dir: Path = STAGING_DIR, fmt: str = "csv"):
+    with TableWriter(staging_dir, name, fmt, STAGING_SCHEMAS.get(name)) as writer:
+        for chunk in chunks:
+            if not chunk.empty:
+                writer.write(chunk)
+    if writer.rows:
+        print(f"Streamed {writer.rows} rows into {writer.path}")
+    return writer.rows
+
+
 def archive_csvs(src_dir: Path, output_path: Path):
     files = list(src_dir.glob("*.csv"))
     if not files:
@@ -51,103 +91,312 @@ def archive_csvs(src_dir: Path, output_path: Path):
     return output_path
 
 
-channel = load("channel")
-province = load("province")
-product_category = load("product_category")
-customer = load("customer")
-address = load("address")
-store = load("store")
-product = load("product")
-sales_order = load("sales_order")
-sales_item = load("sales_order_item")
-payment = load("payment")
-shipment = load("shipment")
-web_session = load("web_session")
-nps = load("nps_response")
-
-
-stg_address = (
-    address
-    .merge(province.add_prefix("province_"), left_on="province_id", right_on="province_province_id", how="left")
-    .drop(columns=["province_province_id"]) if not province.empty else address
-)
-if not stg_address.empty:
-    save(stg_address, "stg_address")
+def join_prefixed(left: pd.DataFrame, right: pd.DataFrame, prefix: str, left_on: str, right_key: str, columns=None) -> pd.DataFrame:
+    # With a column contract the right side is cut down to the prefixed
+    # columns the contract asks for, and the merge is skipped if it asks for none.
+    if columns is not None:
+        wanted = [c for c in right.columns if c != right_key and f"{prefix}{c}" in columns]
+        if not wanted and f"{prefix}{right_key}" not in columns:
+            return left
+        right = right[[right_key] + wanted]
+    with step("merge", f"{prefix}*", rows_in=len(left), right_rows=len(right)) as record:
+        out = left.merge(right.add_prefix(prefix), left_on=left_on, right_on=f"{prefix}{right_key}", how="left")
+        record["rows_out"] = len(out)
+    return out
 
 
-stg_store = (store.merge(stg_address.add_prefix("addr_"), left_on="address_id", right_on="addr_address_id", how="left")) if not store.empty else pd.DataFrame()
-if not stg_store.empty:
-    save(stg_store, "stg_store")
+def join_role(left: pd.DataFrame, role: pd.DataFrame, key: str, columns=None) -> pd.DataFrame:
+    if columns is not None:
+        wanted = [c for c in role.columns if c != key and c in columns]
+        if not wanted:
+            return left
+        role = role[[key] + wanted]
+    with step("merge", key, rows_in=len(left), right_rows=len(role)) as record:
+        out = left.merge(role, on=key, how="left")
+        record["rows_out"] = len(out)
+    return out
 
 
-stg_product_category = (product_category.merge(product_category.add_prefix("parent_"), left_on="parent_id", right_on="parent_category_id", how="left")) if not product_category.empty else pd.DataFrame()
-if not stg_product_category.empty:
-    save(stg_product_category, "stg_product_category")
+def project(df: pd.DataFrame, columns=None) -> pd.DataFrame:
+    if columns is None or df.columns.empty:
+        return df
+    return df[[c for c in df.columns if c in columns]]
 
 
-stg_product = (product.merge(stg_product_category[["category_id", "name", "parent_name"]].rename(columns={"name": "category_name", "parent_name": "parent_category_name"}), on="category_id", how="left")) if not product.empty else pd.DataFrame()
-if not stg_product.empty:
-    save(stg_product, "stg_product")
+def stage_address(address: pd.DataFrame, province: pd.DataFrame) -> pd.DataFrame:
+    if province.empty:
+        return address
+    return join_prefixed(address, province, "province_", "province_id", "province_id").drop(columns=["province_province_id"])
 
 
-if not customer.empty:
-    save(customer, "stg_customer")
+def stage_store(store: pd.DataFrame, stg_address: pd.DataFrame) -> pd.DataFrame:
+    return join_prefixed(store, stg_address, "addr_", "address_id", "address_id") if not store.empty else pd.DataFrame()
 
 
-if not channel.empty:
-    save(channel, "stg_channel")
+def stage_product_category(product_category: pd.DataFrame) -> pd.DataFrame:
+    return join_prefixed(product_category, product_category, "parent_", "parent_id", "category_id") if not product_category.empty else pd.DataFrame()
 
 
-if not province.empty:
-    save(province, "stg_province")
+def stage_product(product: pd.DataFrame, stg_product_category: pd.DataFrame) -> pd.DataFrame:
+    categories = stg_product_category[["category_id", "name", "parent_name"]].rename(columns={"name": "category_name", "parent_name": "parent_category_name"})
+    return join_role(product, categories, "category_id") if not product.empty else pd.DataFrame()
 
 
-addr_cols = ["address_id", "line1", "line2", "city", "province_id", "postal_code", "country_code", "created_at"]
-billing = stg_address[["address_id", "city", "province_id", "province_name"]].rename(columns={"address_id": "billing_address_id", "city": "billing_city", "province_id": "billing_province_id", "province_name": "billing_province_name"})
-shipping = stg_address[["address_id", "city", "province_id", "province_name"]].rename(columns={"address_id": "shipping_address_id", "city": "shipping_city", "province_id": "shipping_province_id", "province_name": "shipping_province_name"})
+def address_roles(stg_address: pd.DataFrame):
+    billing = stg_address[["address_id", "city", "province_id", "province_name"]].rename(columns={"address_id": "billing_address_id", "city": "billing_city", "province_id": "billing_province_id", "province_name": "billing_province_name"})
+    shipping = stg_address[["address_id", "city", "province_id", "province_name"]].rename(columns={"address_id": "shipping_address_id", "city": "shipping_city", "province_id": "shipping_province_id", "province_name": "shipping_province_name"})
+    return billing, shipping
 
-stg_sales_order = (sales_order.merge(channel.add_prefix("channel_"), left_on="channel_id", right_on="channel_channel_id", how="left")
-                  .merge(customer.add_prefix("cust_"), left_on="customer_id", right_on="cust_customer_id", how="left")
-                  .merge(stg_store.add_prefix("store_"), left_on="store_id", right_on="store_store_id", how="left")
-                  .merge(billing, on="billing_address_id", how="left")
-                  .merge(shipping, on="shipping_address_id", how="left")) if not sales_order.empty else pd.DataFrame()
-if not stg_sales_order.empty:
-    save(stg_sales_order, "stg_sales_order")
 
-
-stg_sales_order_item = (sales_item.merge(stg_product.add_prefix("prod_"), left_on="product_id", right_on="prod_product_id", how="left")
-                       .merge(stg_sales_order.add_prefix("ord_"), left_on="order_id", right_on="ord_order_id", how="left")) if not sales_item.empty else pd.DataFrame()
-if not stg_sales_order_item.empty:
-    save(stg_sales_order_item, "stg_sales_order_item")
+def stage_sales_order(sales_order: pd.DataFrame, channel: pd.DataFrame, customer: pd.DataFrame, stg_store: pd.DataFrame, billing: pd.DataFrame, shipping: pd.DataFrame, columns=None) -> pd.DataFrame:
+    if sales_order.columns.empty:
+        return pd.DataFrame()
+    out = join_prefixed(sales_order, channel, "channel_", "channel_id", "channel_id", columns)
+    out = join_prefixed(out, customer, "cust_", "customer_id", "customer_id", columns)
+    out = join_prefixed(out, stg_store, "store_", "store_id", "store_id", columns)
+    out = join_role(out, billing, "billing_address_id", columns)
+    out = join_role(out, shipping, "shipping_address_id", columns)
+    return project(out, columns)
 
 
-stg_payment = (payment.merge(stg_sales_order.add_prefix("ord_"), left_on="order_id", right_on="ord_order_id", how="left")) if not payment.empty else pd.DataFrame()
-if not stg_payment.empty:
-    save(stg_payment, "stg_payment")
+def stage_sales_order_item(sales_item: pd.DataFrame, stg_product: pd.DataFrame, stg_sales_order: pd.DataFrame, columns=None) -> pd.DataFrame:
+    if sales_item.empty:
+        return pd.DataFrame()
+    out = join_prefixed(sales_item, stg_product, "prod_", "product_id", "product_id", columns)
+    out = join_prefixed(out, stg_sales_order, "ord_", "order_id", "order_id", columns)
+    return project(out, columns)
 
 
-stg_shipment = (shipment.merge(stg_sales_order.add_prefix("ord_"), left_on="order_id", right_on="ord_order_id", how="left")) if not shipment.empty else pd.DataFrame()
-if not stg_shipment.empty:
-    save(stg_shipment, "stg_shipment")
+def stage_order_child(child: pd.DataFrame, stg_sales_order: pd.DataFrame, columns=None) -> pd.DataFrame:
+    if child.empty:
+        return pd.DataFrame()
+    return project(join_prefixed(child, stg_sales_order, "ord_", "order_id", "order_id", columns), columns)
 
 
-stg_web_session = web_session.merge(customer.add_prefix("cust_"), left_on="customer_id", right_on="cust_customer_id", how="left") if not web_session.empty else pd.DataFrame()
-if not stg_web_session.empty:
-    save(stg_web_session, "stg_web_session")
+def stage_web_session(web_session: pd.DataFrame, customer: pd.DataFrame, columns=None) -> pd.DataFrame:
+    if web_session.empty:
+        return pd.DataFrame()
+    return project(join_prefixed(web_session, customer, "cust_", "customer_id", "customer_id", columns), columns)
 
 
-stg_nps = (nps.merge(channel.add_prefix("channel_"), left_on="channel_id", right_on="channel_channel_id", how="left")
-           .merge(customer.add_prefix("cust_"), left_on="customer_id", right_on="cust_customer_id", how="left")) if not nps.empty else pd.DataFrame()
-if not stg_nps.empty:
-    save(stg_nps, "stg_nps_response")
+def stage_nps(nps: pd.DataFrame, channel: pd.DataFrame, customer: pd.DataFrame, columns=None) -> pd.DataFrame:
+    if nps.empty:
+        return pd.DataFrame()
+    out = join_prefixed(nps, channel, "channel_", "channel_id", "channel_id", columns)
+    out = join_prefixed(out, customer, "cust_", "customer_id", "customer_id", columns)
+    return project(out, columns)
+
+
+def lookup_orders(orders_by_id: pd.DataFrame, order_ids: pd.Series) -> pd.DataFrame:
+    # Only the orders referenced by the current chunk get widened, so the
+    # prefixed stg_sales_order frame never exists in full while streaming.
+    found = orders_by_id.index.intersection(pd.Index(order_ids.dropna().unique(), name="order_id"))
+    return orders_by_id.loc[found].reset_index()
+
+
+def no_order_columns(child: pd.DataFrame) -> pd.DataFrame:
+    # Under the column contracts no child keeps an ord_* column, so there is
+    # nothing to widen and the raw orders need not be resident.
+    return pd.DataFrame({"order_id": pd.Series(dtype="int64")})
+
+
+def order_widener(sales_order: pd.DataFrame, channel: pd.DataFrame, customer: pd.DataFrame, stg_store: pd.DataFrame, roles, columns=None):
+    orders_by_id = sales_order.set_index("order_id") if not sales_order.empty else pd.DataFrame(index=pd.Index([], name="order_id"))
+    billing, shipping = roles
+
+    def widen(child: pd.DataFrame) -> pd.DataFrame:
+        return stage_sales_order(lookup_orders(orders_by_id, child["order_id"]), channel, customer, stg_store, billing, shipping, columns)
+
+    return widen
+
+
+def validate(name: str, df: pd.DataFrame, parents, staging_dir: Path = STAGING_DIR, write: bool = True) -> pd.DataFrame:
+    validator = Validator(name, {p: valid_keys(p, parent) for p, parent in zip(parents_of(name), parents)})
+    with step("validate", name, rows_in=len(df)) as record:
+        good, bad = validator.apply(df)
+        record["quarantined"] = len(bad)
+    if write:
+        quarantine(name, [bad], validator.counts, staging_dir)
+    return good
+
+
+def build_staging(raw_dir: Path = RAW_DIR, staging_dir: Path = STAGING_DIR, chunk_rows: int = None, fmt: str = "csv", incremental: bool = False, workers: int = 1, full_width: bool = False, memory_report: bool = False, force: bool = False):
+    state_path = staging_dir / STATE_FILE
+    state = load_state(state_path)
+    contracts = {} if full_width else STAGING_CONTRACTS
+    codec, level = compression()
+    cache = BuildCache(staging_dir / CACHE_FILE, salt=options_salt(format=fmt, full_width=full_width, incremental=incremental, compress=codec, compress_level=level), force=force)
+
+    def changed(name: str, df: pd.DataFrame) -> pd.DataFrame:
+        return newer_than(df, RAW_WATERMARKS[name], state.get(name)) if incremental else df
+
+    def publish(df: pd.DataFrame, name: str, key: str):
+        if df.empty:
+            return
+        if incremental:
+            rows = upsert_table(df, staging_dir, name, key, fmt, STAGING_SCHEMAS.get(name))
+            print(f"Upserted {rows} rows into {table_path(staging_dir, name, fmt)}")
+        else:
+            save(df, name, staging_dir, fmt)
+
+    def replace(df: pd.DataFrame, name: str) -> pd.DataFrame:
+        if not df.empty:
+            save(df, name, staging_dir, fmt)
+        return df
+
+    def raw(name: str) -> Node:
+        watermark = RAW_WATERMARKS.get(name, [])
+        sources = [table_path(raw_dir, name, "csv")]
+        if name not in NATURAL_KEYS:
+            return Node(name, lambda: load(name, raw_dir, raw_columns(name, contracts, watermark), memory_report), sources=sources)
+        # Streamed orders are quarantined by their stream node; the resident
+        # copy kept for --full-width is only validated so it widens the same orders.
+        write = not (chunk_rows and name == "sales_order")
+        columns = raw_columns(name, contracts, watermark + rule_columns(name))
+        return Node(name, lambda *parents: validate(name, load(name, raw_dir, columns, memory_report), parents, staging_dir, write), parents_of(name), sources=sources)
+
+    def staged(name: str):
+        return lambda: read_table(staging_dir, name, fmt, schema=STAGING_SCHEMAS.get(name))
+
+    def targets(nodes):
+        # Up-to-date staging tables that a rebuilt table joins against are read back, not rebuilt.
+        return [replace_node(n, outputs=[output_path(staging_dir, n.name, fmt)], load=n.load or staged(n.name)) if n.name.startswith("stg_") else n for n in nodes]
+
+    # Streamed children are checked against the order ids the stg_sales_order
+    # stream accepted, so raw orders are only held in memory to widen them
+    # with --full-width.
+    resident_orders = not chunk_rows or full_width
+    nodes = [raw(name) for name in ["channel", "province", "product_category", "customer", "address", "store", "product"] + (["sales_order"] if resident_orders else [])]
+    nodes += [
+        # Stores and address roles join the whole address row; the staged table is projected.
+        Node("joined_address", stage_address, ["address", "province"]),
+        Node("stg_address", lambda joined_address: replace(project(joined_address, contracts.get("stg_address")), "stg_address"), ["joined_address"]),
+        Node("stg_store", lambda store, joined_address: replace(stage_store(store, joined_address), "stg_store"), ["store", "joined_address"]),
+        Node("stg_product_category", lambda product_category: replace(stage_product_category(product_category), "stg_product_category"), ["product_category"]),
+        Node("stg_product", lambda product, stg_product_category: replace(project(stage_product(product, stg_product_category), contracts.get("stg_product")), "stg_product"), ["product", "stg_product_category"]),
+        Node("stg_customer", lambda customer: replace(customer, "stg_customer"), ["customer"]),
+        Node("stg_channel", lambda channel: replace(channel, "stg_channel"), ["channel"]),
+        Node("stg_province", lambda province: replace(province, "stg_province"), ["province"]),
+        Node("address_roles", address_roles, ["joined_address"]),
+    ]
+    if not resident_orders:
+        nodes.append(Node("order_widener", lambda: no_order_columns))
+    elif chunk_rows or incremental:
+        widener = lambda *inputs: order_widener(*inputs, contracts.get("stg_sales_order"))
+        nodes.append(Node("order_widener", widener, ["sales_order", "channel", "customer", "stg_store", "address_roles"]))
+    else:
+        nodes.append(Node("order_widener", lambda: None))
+    if chunk_rows:
+        nodes += stream_nodes(raw_dir, staging_dir, chunk_rows, fmt, contracts)
+        run_dag(targets(nodes), workers, cache)
+        return
+
+    def stg_sales_order(sales_order, channel, customer, stg_store, roles):
+        billing, shipping = roles
+        df = stage_sales_order(changed("sales_order", sales_order), channel, customer, stg_store, billing, shipping, contracts.get("stg_sales_order"))
+        publish(df, "stg_sales_order", "order_id")
+        return df
+
+    def stg_sales_order_item(sales_item, stg_product, stg_sales_order):
+        if incremental and not sales_item.empty:
+            sales_item = sales_item[sales_item["order_id"].isin(stg_sales_order.get("order_id", pd.Series(dtype="Int64")))]
+        publish(stage_sales_order_item(sales_item, stg_product, stg_sales_order, contracts.get("stg_sales_order_item")), "stg_sales_order_item", "order_item_id")
+
+    def stg_order_child(raw_name: str, name: str, key: str):
+        def build(child, stg_sales_order, widen):
+            child = changed(raw_name, child)
+            # New payments and shipments often belong to orders loaded on an
+            # earlier run, so they are widened from the raw orders instead.
+            orders = widen(child) if incremental and not child.empty else stg_sales_order
+            publish(stage_order_child(child, orders, contracts.get(name)), name, key)
+        return Node(name, build, [raw_name, "stg_sales_order", "order_widener"])
+
+    nodes += [raw(name) for name in ["sales_order_item", "payment", "shipment", "web_session", "nps_response"]]
+    nodes += [
+        Node("stg_sales_order", stg_sales_order, ["sales_order", "channel", "customer", "stg_store", "address_roles"]),
+        Node("stg_sales_order_item", stg_sales_order_item, ["sales_order_item", "stg_product", "stg_sales_order"]),
+        stg_order_child("payment", "stg_payment", "payment_id"),
+        stg_order_child("shipment", "stg_shipment", "shipment_id"),
+        Node("stg_web_session", lambda web_session, customer: publish(stage_web_session(changed("web_session", web_session), customer, contracts.get("stg_web_session")), "stg_web_session", "session_id"), ["web_session", "customer"]),
+        Node("stg_nps_response", lambda nps, channel, customer: publish(stage_nps(changed("nps_response", nps), channel, customer, contracts.get("stg_nps_response")), "stg_nps_response", "nps_id"), ["nps_response", "channel", "customer"]),
+    ]
+    results = run_dag(targets(nodes), workers, cache)
+
+    for name, columns in RAW_WATERMARKS.items():
+        if results[name] is not None:
+            state[name] = high_water(results[name], columns, state.get(name))
+    save_state({k: v for k, v in state.items() if v is not None}, state_path)
+
+
+# Streamed parent table -> the stream node that returns its accepted keys.
+STREAMED_PARENTS = {"sales_order": "stg_sales_order"}
+
+
+def stream_nodes(raw_dir: Path, staging_dir: Path, chunk_rows: int, fmt: str, contracts=STAGING_CONTRACTS):
+    def stream(name: str, source: str, transform, inputs):
+        columns = contracts.get(name)
+        parents = parents_of(source)
+
+        def run(*resident):
+            resident, parent_inputs = resident[:len(inputs)], resident[len(inputs):]
+            validator = Validator(source, {p: keys if isinstance(keys, KeySet) else valid_keys(p, keys) for p, keys in zip(parents, parent_inputs)})
+            accepted = KeySet() if source in STREAMED_PARENTS else None
+            rejected = []
+
+            def checked(chunks):
+                for chunk in chunks:
+                    good, bad = validator.apply(chunk)
+                    rejected.append(bad)
+                    if accepted is not None and not good.empty:
+                        accepted.add(pd.to_numeric(good[NATURAL_KEYS[source]], errors="coerce").dropna().to_numpy(dtype="int64"))
+                    if not good.empty:
+                        yield good
+            chunks = load_chunks(source, raw_dir, chunk_rows, raw_columns(source, contracts, rule_columns(source)))
+            save_chunks((transform(chunk, *resident, columns=columns) for chunk in checked(chunks)), name, staging_dir, fmt)
+            quarantine(source, rejected, validator.counts, staging_dir)
+            return accepted
+        def accepted_keys() -> KeySet:
+            key = NATURAL_KEYS[source]
+            return KeySet(read_table(staging_dir, name, fmt, columns=[key])[key].to_numpy(dtype="int64"))
+
+        load = accepted_keys if source in STREAMED_PARENTS else None
+        return Node(name, run, inputs + [STREAMED_PARENTS.get(p, p) for p in parents], sources=[table_path(raw_dir, source, "csv")], load=load)
+
+    def sales_order(chunk, channel, customer, stg_store, roles, columns=None):
+        billing, shipping = roles
+        return stage_sales_order(chunk, channel, customer, stg_store, billing, shipping, columns)
+
+    # Children join against the narrow raw orders; each chunk widens only the
+    # orders it references.
+    return [
+        stream("stg_sales_order", "sales_order", sales_order, ["channel", "customer", "stg_store", "address_roles"]),
+        stream("stg_sales_order_item", "sales_order_item", lambda c, stg_product, widen, columns: stage_sales_order_item(c, stg_product, widen(c), columns), ["stg_product", "order_widener"]),
+        stream("stg_payment", "payment", lambda c, widen, columns: stage_order_child(c, widen(c), columns), ["order_widener"]),
+        stream("stg_shipment", "shipment", lambda c, widen, columns: stage_order_child(c, widen(c), columns), ["order_widener"]),
+        stream("stg_web_session", "web_session", stage_web_session, ["customer"]),
+        stream("stg_nps_response", "nps_response", stage_nps, ["channel", "customer"]),
+    ]
 
 
 def main(argv=None):
     parser = argparse.ArgumentParser(description="Desnormalizador: crea archivos STAGING a partir de RAW CSVs")
-    parser.add_argument("--raw-dir", default=str(RAW_DIR), help="Path to raw CSV folder")
-    parser.add_argument("--staging-dir", default=str(STAGING_DIR), help="Path to write staging CSVs")
+    parser.add_argument("--raw-dir", default=str(RAW_DIR), help="Path to raw CSV folder (CSVs may be .gz/.zst) or to a .zip archive of them")
+    parser.add_argument("--staging-dir", default=str(STAGING_DIR), help="Path to write staging files")
     parser.add_argument("--zip-raw", default=None, help="If set, create a ZIP archive of all raw CSVs at this path")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv", help="Staging file format")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="Stream sales orders, items, payments, shipments, sessions and NPS in chunks of N rows")
+    parser.add_argument("--incremental", action="store_true", help="Only stage raw rows newer than the watermarks of the previous run and upsert them")
+    parser.add_argument("--workers", type=int, default=1, help="Build independent staging tables concurrently on N threads")
+    parser.add_argument("--full-width", action="store_true", help="Keep every joined column in staging instead of only the columns DimFacts consumes")
+    parser.add_argument("--memory-report", action="store_true", help="Print the in-memory size of each raw table without and with the dtype plan")
+    parser.add_argument("--compress", choices=sorted(CSV_CODECS), default=None, help="Compress staging outputs (CSV as .csv.gz/.csv.zst, parquet/feather internally) on a background thread")
+    parser.add_argument("--compress-level", type=int, default=None, help="Compression level for --compress (codec default if omitted)")
+    parser.add_argument("--force", action="store_true", help="Rebuild every staging table even if its raw inputs are unchanged since the last run")
+    parser.add_argument("--manifest", default=None, help=f"JSON-lines run manifest to append step timings to (default: STAGING_DIR/{MANIFEST_FILE})")
+    parser.add_argument("--profile", default=None, help="Write a cProfile dump (or a pyinstrument report if the path ends in .html) of the main thread")
     args = parser.parse_args(argv)
+    if args.incremental and args.chunk_rows:
+        parser.error("--incremental and --chunk-rows cannot be combined")
 
     raw_dir = Path(args.raw_dir)
     staging_dir = Path(args.staging_dir)
@@ -159,6 +408,10 @@ def main(argv=None):
     if args.zip_raw:
         archive_csvs(raw_dir, Path(args.zip_raw))
 
+    manifest = Path(args.manifest) if args.manifest else staging_dir / MANIFEST_FILE
+    with run_manifest(manifest, "Desnormalizador", vars(args)), profiled(args.profile), compressed_output(args.compress, args.compress_level):
+        build_staging(raw_dir, staging_dir, chunk_rows=args.chunk_rows, fmt=args.format, incremental=args.incremental, workers=args.workers, full_width=args.full_width, memory_report=args.memory_report, force=args.force)
+
     print("✅ Staging listo: archivos desnormalizados en carpeta", staging_dir)
 
 
@@ -168,4 +421,3 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"Fatal error: {e}")
         sys.exit(1)
- 
@@ -1,327 +1,476 @@
 from pathlib import Path
+from dataclasses import replace
 import argparse
+import shutil
 import sys
 import pandas as pd
-from typing import Dict, Any
+from typing import Callable, Dict, Iterable, Optional
 
+from schemas import STAGING_CONTRACTS, STAGING_SCHEMAS, compact_keys, report_memory
+from storage import CSV_CODECS, FORMATS, compressed_output, compression, output_path, read_table, table_path, write_table
+from key_registry import KEYS_DIR, KeyRegistry
+from aggregates import AGGREGATES, refresh_aggregate
+from lifecycle import order_lifecycle
+from scd import SCD_COLUMNS, resolve_versions, row_hash, scd2_merge
+from partitions import FACT_PARTITIONS, partition_dir, read_fact, upsert_partitioned, write_partitioned
+from sqlite_dw import SQLITE_FILE, export_sqlite
+from calendar_dim import ROLE_DATE_KEYS, add_date_keys, build_calendar, date_key
+from build_cache import CACHE_FILE, BuildCache, options_salt
+from executor import Node, run_dag
+from instrumentation import MANIFEST_FILE, profiled, run_manifest, step
+from incremental import FACT_WATERMARKS, STATE_FILE, high_water, load_state, newer_than, save_state, upsert_table
 
-def read_staging(name: str, staging_dir: Path) -> pd.DataFrame:
-    path = staging_dir / f"{name}.csv"
+
+# Natural key -> (Type 2 dimension, its surrogate key, its natural key column).
+SCD_DIMS = {
+    "customer_id": ("dim_customer", "customer_key", "customer_natural_key"),
+    "product_id": ("dim_product", "product_key", "product_natural_key"),
+    "store_id": ("dim_store", "store_key", "store_natural_key"),
+    "address_id": ("dim_address", "address_key", "address_natural_key"),
+}
+
+DATED_STAGING = ["stg_sales_order", "stg_payment", "stg_shipment", "stg_nps_response", "stg_web_session"]
+
+
+def read_staging(name: str, staging_dir: Path, fmt: str = "csv", columns: Optional[Iterable[str]] = None, memory_report: bool = False) -> pd.DataFrame:
+    path = table_path(staging_dir, name, fmt)
     if not path.exists():
         print(f"⚠️  Staging file not found: {path}. Returning empty DataFrame.")
         return pd.DataFrame()
-    return pd.read_csv(path)
+    df = read_table(staging_dir, name, fmt, columns=columns, schema=STAGING_SCHEMAS.get(name))
+    if memory_report:
+        report_memory(name, read_table(staging_dir, name, fmt, columns=columns), df)
+    return df
+
 
+def build_order_bridge(sales: pd.DataFrame, keys_for: Callable) -> pd.DataFrame:
+    bridge = pd.DataFrame({"order_id": sales["order_id"]})
+    at = sales["order_date"] if "order_date" in sales.columns else None
+    for natural in ["customer_id", "channel_id", "store_id"]:
+        keys = keys_for(natural, sales[natural], at) if natural in sales.columns else None
+        if keys is not None:
+            bridge[natural.replace("_id", "_key")] = keys.to_numpy()
+    if "order_date" in sales.columns:
+        bridge["order_date_key"] = date_key(sales["order_date"]).to_numpy()
+    return bridge.drop_duplicates(subset=["order_id"])
 
-def build_dims_and_facts(staging_dir: Path, dw_dir: Path):
+
+def attach_order_bridge(fact: pd.DataFrame, bridge: pd.DataFrame) -> pd.DataFrame:
+    if bridge.empty or "order_id" not in fact.columns:
+        return fact
+    with step("merge", "order_bridge", rows_in=len(fact), right_rows=len(bridge)) as record:
+        fact = fact.merge(bridge, on="order_id", how="left")
+        record["rows_out"] = len(fact)
+    return fact
+
+
+def build_dims_and_facts(staging_dir: Path, dw_dir: Path, fmt: str = "csv", incremental: bool = False, workers: int = 1, memory_report: bool = False, sqlite_path: Optional[Path] = None, partition_facts: bool = False, force: bool = False, effective: Optional[str] = None):
     dw_dir.mkdir(parents=True, exist_ok=True)
+    codec, level = compression()
+    salt = options_salt(format=fmt, incremental=incremental, partition_facts=partition_facts, effective_date=effective, compress=codec, compress_level=level)
+    effective = pd.Timestamp(effective) if effective else pd.Timestamp.now().floor("s")
+    state_path = dw_dir / STATE_FILE
+    state = load_state(state_path)
 
     
-    cust = read_staging("stg_customer", staging_dir)
-    prod = read_staging("stg_product", staging_dir)
-    chan = read_staging("stg_channel", staging_dir)
-    store = read_staging("stg_store", staging_dir)
-    addr = read_staging("stg_address", staging_dir)
-    sales = read_staging("stg_sales_order", staging_dir)
-    sales_item = read_staging("stg_sales_order_item", staging_dir)
-    payments = read_staging("stg_payment", staging_dir)
-    shipments = read_staging("stg_shipment", staging_dir)
-    web_sessions = read_staging("stg_web_session", staging_dir)
-    nps = read_staging("stg_nps_response", staging_dir)
+    def new_rows(df: pd.DataFrame, fact: str) -> pd.DataFrame:
+        return newer_than(df, FACT_WATERMARKS[fact], state.get(fact)) if incremental else df
 
-    
-    def make_mapping(series: pd.Series) -> Dict[Any, int]:
-        vals = pd.Series(series.dropna().unique())
-        return {v: int(i + 1) for i, v in enumerate(vals)}
-
-    mappings: Dict[str, Dict[Any, int]] = {}
-
-    if not cust.empty:
-        dim_customer = cust.copy()
-        if "customer_id" in dim_customer.columns:
-            cust_map = make_mapping(dim_customer["customer_id"])
-            mappings["customer_id"] = cust_map
-            dim_customer = dim_customer.drop_duplicates(subset=["customer_id"]).copy()
-            dim_customer["customer_key"] = dim_customer["customer_id"].map(cust_map).astype(int)
-            dim_customer = dim_customer.rename(columns={"customer_id": "customer_natural_key"})
-            cols = [c for c in ["customer_key"] if c in dim_customer.columns] + [c for c in dim_customer.columns if c != "customer_key"]
-            dim_customer = dim_customer[cols]
-        dim_customer.to_csv(dw_dir / "dim_customer.csv", index=False)
-        print(f"Wrote dim_customer ({len(dim_customer)} rows)")
-    else:
-        print("dim_customer skipped (no data)")
+    def write_fact(df: pd.DataFrame, name: str, key: str):
+        df = compact_keys(df)
+        if partition_facts and name in FACT_PARTITIONS:
+            if incremental:
+                parts = upsert_partitioned(df, dw_dir, name, key, fmt)
+                print(f"Upserted {name} ({len(df)} rows into {parts} partitions)")
+            else:
+                parts = write_partitioned(df, dw_dir, name, fmt)
+                print(f"Wrote {name} ({len(df)} rows in {parts} partitions)")
+            return df
+        if partition_dir(dw_dir, name).is_dir():
+            if incremental:
+                raise RuntimeError(f"{name} was built partitioned; pass --partition-facts or do a full rebuild")
+            shutil.rmtree(partition_dir(dw_dir, name))
+        if incremental:
+            upsert_table(df, dw_dir, name, key, fmt)
+            print(f"Upserted {name} ({len(df)} rows)")
+        else:
+            write_table(df, dw_dir, name, fmt)
+            print(f"Wrote {name} ({len(df)} rows)")
+        return df
 
-    
-    if not prod.empty:
-        dim_product = prod.copy()
-        if "product_id" in dim_product.columns:
-            prod_map = make_mapping(dim_product["product_id"])
-            mappings["product_id"] = prod_map
-            dim_product = dim_product.drop_duplicates(subset=["product_id"]).copy()
-            dim_product["product_key"] = dim_product["product_id"].map(prod_map).astype(int)
-            dim_product = dim_product.rename(columns={"product_id": "product_natural_key", "name": "product_name"})
-            keep = [c for c in ["product_key", "product_natural_key", "product_name", "category_name", "parent_category_name"] if c in dim_product.columns]
-            dim_product = dim_product[keep]
+    mappings: Dict[str, KeyRegistry] = {}
+
+    def registry(name: str) -> KeyRegistry:
+        if name not in mappings:
+            mappings[name] = KeyRegistry.open(dw_dir, name)
+        return mappings[name]
+
+    versions: Dict[str, pd.DataFrame] = {}
+
+    def dim_versions(name: str) -> Optional[pd.DataFrame]:
+        # Skipped (cached) dimensions are read back from the DW.
+        if name not in versions and table_path(dw_dir, name, fmt).exists():
+            dim = read_table(dw_dir, name, fmt)
+            if set(SCD_COLUMNS) <= set(dim.columns):
+                versions[name] = dim
+        return versions.get(name)
+
+    def keys_for(natural: str, values: pd.Series, at: Optional[pd.Series]) -> Optional[pd.Series]:
+        if natural in SCD_DIMS:
+            name, key, natural_key = SCD_DIMS[natural]
+            dim = dim_versions(name)
+            return None if dim is None else resolve_versions(values, at if at is not None else pd.Series(pd.NaT, index=values.index), dim, key, natural_key)
+        return mappings[natural].lookup(values) if natural in mappings else None
+
+    def write_scd_dim(snapshot: pd.DataFrame, name: str):
+        natural = next(n for n, spec in SCD_DIMS.items() if spec[0] == name)
+        _, key, natural_key = SCD_DIMS[natural]
+        existing = read_table(dw_dir, name, fmt) if table_path(dw_dir, name, fmt).exists() else None
+        if existing is not None and not set(SCD_COLUMNS) <= set(existing.columns):
+            print(f"⚠️  {name} has no version history yet; starting it from this snapshot")
+            existing = None
+        dim = compact_keys(scd2_merge(snapshot, existing, key, natural_key, effective))
+        write_table(dim, dw_dir, name, fmt)
+        versions[name] = dim
+        print(f"Wrote {name} ({len(dim)} versions, {int(dim['is_current'].sum())} current)")
+
+    def build_dim_customer(cust: pd.DataFrame):
+        if not cust.empty:
+            dim_customer = cust.copy()
+            if "customer_id" in dim_customer.columns:
+                return write_scd_dim(dim_customer.rename(columns={"customer_id": "customer_natural_key"}), "dim_customer")
+            write_table(compact_keys(dim_customer), dw_dir, "dim_customer", fmt)
+            print(f"Wrote dim_customer ({len(dim_customer)} rows)")
         else:
-            keep = [c for c in ["name", "category_name", "parent_category_name"] if c in dim_product.columns]
-            dim_product = dim_product[keep]
-        dim_product.to_csv(dw_dir / "dim_product.csv", index=False)
-        print(f"Wrote dim_product ({len(dim_product)} rows)")
-    else:
-        print("dim_product skipped (no data)")
-    
-    if not chan.empty:
-        dim_channel = chan.copy()
-        if "channel_id" in dim_channel.columns:
-            chan_map = make_mapping(dim_channel["channel_id"])
-            mappings["channel_id"] = chan_map
-            dim_channel = dim_channel.drop_duplicates(subset=["channel_id"]).copy()
-            dim_channel["channel_key"] = dim_channel["channel_id"].map(chan_map).astype(int)
-            dim_channel = dim_channel.rename(columns={"channel_id": "channel_natural_key"})
-            cols = [c for c in ["channel_key"] if c in dim_channel.columns] + [c for c in dim_channel.columns if c != "channel_key"]
-            dim_channel = dim_channel[cols]
-        dim_channel.to_csv(dw_dir / "dim_channel.csv", index=False)
-        print(f"Wrote dim_channel ({len(dim_channel)} rows)")
-    else:
-        print("dim_channel skipped (no data)")
+            print("dim_customer skipped (no data)")
 
     
-    if not store.empty:
-        dim_store = store.copy()
-        if "store_id" in dim_store.columns:
-            store_map = make_mapping(dim_store["store_id"])
-            mappings["store_id"] = store_map
-            dim_store = dim_store.drop_duplicates(subset=["store_id"]).copy()
-            dim_store["store_key"] = dim_store["store_id"].map(store_map).astype(int)
-            dim_store = dim_store.rename(columns={"store_id": "store_natural_key"})
-            cols = [c for c in ["store_key"] if c in dim_store.columns] + [c for c in dim_store.columns if c != "store_key"]
-            dim_store = dim_store[cols]
-        dim_store.to_csv(dw_dir / "dim_store.csv", index=False)
-        print(f"Wrote dim_store ({len(dim_store)} rows)")
-    else:
-        print("dim_store skipped (no data)")
+    def build_dim_product(prod: pd.DataFrame):
+        if not prod.empty:
+            dim_product = prod.copy()
+            if "product_id" in dim_product.columns:
+                dim_product = dim_product.rename(columns={"product_id": "product_natural_key", "name": "product_name"})
+                keep = [c for c in ["product_natural_key", "product_name", "category_name", "parent_category_name"] if c in dim_product.columns]
+                return write_scd_dim(dim_product[keep], "dim_product")
+            else:
+                keep = [c for c in ["name", "category_name", "parent_category_name"] if c in dim_product.columns]
+                dim_product = dim_product[keep]
+            write_table(compact_keys(dim_product), dw_dir, "dim_product", fmt)
+            print(f"Wrote dim_product ({len(dim_product)} rows)")
+        else:
+            print("dim_product skipped (no data)")
+    
+    def build_dim_channel(chan: pd.DataFrame):
+        if not chan.empty:
+            dim_channel = chan.copy()
+            if "channel_id" in dim_channel.columns:
+                dim_channel = dim_channel.drop_duplicates(subset=["channel_id"]).copy()
+                dim_channel["channel_key"] = registry("channel_id").assign(dim_channel["channel_id"]).astype(int)
+                dim_channel = dim_channel.rename(columns={"channel_id": "channel_natural_key"})
+                cols = [c for c in ["channel_key"] if c in dim_channel.columns] + [c for c in dim_channel.columns if c != "channel_key"]
+                dim_channel = dim_channel[cols]
+            write_table(compact_keys(dim_channel), dw_dir, "dim_channel", fmt)
+            print(f"Wrote dim_channel ({len(dim_channel)} rows)")
+        else:
+            print("dim_channel skipped (no data)")
 
     
-    if not addr.empty:
-        dim_address = addr.copy()
-        if "address_id" in dim_address.columns:
-            addr_map = make_mapping(dim_address["address_id"])
-            mappings["address_id"] = addr_map
-            dim_address = dim_address.drop_duplicates(subset=["address_id"]).copy()
-            dim_address["address_key"] = dim_address["address_id"].map(addr_map).astype(int)
-            dim_address = dim_address.rename(columns={"address_id": "address_natural_key"})
-            keep = [c for c in ["address_key", "address_natural_key", "line1", "line2", "city", "province_id", "province_name", "postal_code", "country_code"] if c in dim_address.columns]
-            dim_address = dim_address[keep]
+    def build_dim_store(store: pd.DataFrame):
+        if not store.empty:
+            dim_store = store.copy()
+            if "store_id" in dim_store.columns:
+                return write_scd_dim(dim_store.rename(columns={"store_id": "store_natural_key"}), "dim_store")
+            write_table(compact_keys(dim_store), dw_dir, "dim_store", fmt)
+            print(f"Wrote dim_store ({len(dim_store)} rows)")
         else:
-            keep = [c for c in ["line1", "line2", "city", "province_id", "province_name", "postal_code", "country_code"] if c in dim_address.columns]
-            dim_address = dim_address[keep]
-        dim_address.to_csv(dw_dir / "dim_address.csv", index=False)
-        print(f"Wrote dim_address ({len(dim_address)} rows)")
-    else:
-        print("dim_address skipped (no data)")
+            print("dim_store skipped (no data)")
 
     
-    if not sales.empty:
-        date_col = None
-        for c in ["created_at", "order_date", "ord_created_at", "created"]:
-            if c in sales.columns:
-                date_col = c
-                break
-        if date_col is not None:
-            dates = pd.to_datetime(sales[date_col], errors="coerce").dt.date.dropna().unique()
-            dim_date = pd.DataFrame({"date": sorted(dates)})
-            dim_date = dim_date.reset_index(drop=True)
-            dim_date["date_key"] = (dim_date.index + 1).astype(int)
-            dim_date["date"] = pd.to_datetime(dim_date["date"]).dt.date.astype(str)
-            dim_date = dim_date[["date_key", "date"]]
-            mappings["date"] = {row["date"]: int(row["date_key"]) for _, row in dim_date.iterrows()}
-            dim_date.to_csv(dw_dir / "dim_date.csv", index=False)
-            print(f"Wrote dim_date ({len(dim_date)} rows) using column {date_col}")
+    def build_dim_address(addr: pd.DataFrame):
+        if not addr.empty:
+            dim_address = addr.copy()
+            if "address_id" in dim_address.columns:
+                dim_address = dim_address.rename(columns={"address_id": "address_natural_key"})
+                keep = [c for c in ["address_natural_key", "line1", "line2", "city", "province_id", "province_name", "postal_code", "country_code"] if c in dim_address.columns]
+                return write_scd_dim(dim_address[keep], "dim_address")
+            else:
+                keep = [c for c in ["line1", "line2", "city", "province_id", "province_name", "postal_code", "country_code"] if c in dim_address.columns]
+                dim_address = dim_address[keep]
+            write_table(compact_keys(dim_address), dw_dir, "dim_address", fmt)
+            print(f"Wrote dim_address ({len(dim_address)} rows)")
         else:
-            print("dim_date skipped (no date column found in sales)")
-    else:
-        print("dim_date skipped (no sales orders)")
+            print("dim_address skipped (no data)")
 
     
-    if not sales.empty:
-        fact_sales = sales.copy()
-        keep = [c for c in ["order_id", "customer_id", "channel_id", "store_id", "total_amount", "ord_created_at", "created_at", "order_date"] if c in fact_sales.columns]
-        fact_sales = fact_sales[keep]
-        if "order_id" in fact_sales.columns:
-            order_map = make_mapping(fact_sales["order_id"])
-            mappings["order_id"] = order_map
-            fact_sales["order_key"] = fact_sales["order_id"].map(order_map).astype(pd.Int64Dtype())
-        if "customer_id" in fact_sales.columns and "customer_id" in mappings:
-            fact_sales["customer_key"] = fact_sales["customer_id"].map(mappings["customer_id"]).astype(pd.Int64Dtype())
-        if "channel_id" in fact_sales.columns and "channel_id" in mappings:
-            fact_sales["channel_key"] = fact_sales["channel_id"].map(mappings["channel_id"]).astype(pd.Int64Dtype())
-        if "store_id" in fact_sales.columns and "store_id" in mappings:
-            fact_sales["store_key"] = fact_sales["store_id"].map(mappings["store_id"]).astype(pd.Int64Dtype())
-        drop_cols = [c for c in ["order_id", "customer_id", "channel_id", "store_id"] if c in fact_sales.columns]
-        fact_sales = fact_sales.drop(columns=drop_cols)
-        cols = [c for c in ["order_key"] if c in fact_sales.columns]
-        cols += [c for c in ["customer_key", "channel_key", "store_key"] if c in fact_sales.columns]
-        cols += [c for c in fact_sales.columns if c not in cols]
-        fact_sales = fact_sales[cols]
-        fact_sales.to_csv(dw_dir / "fact_sales_order.csv", index=False)
-        print(f"Wrote fact_sales_order ({len(fact_sales)} rows)")
-    else:
-        print("fact_sales_order skipped (no sales orders)")
-
-    order_to_customer_key = {}
-    order_to_channel_key = {}
-    order_to_store_key = {}
-    if not sales.empty and "order_id" in sales.columns:
-        if "customer_id" in sales.columns:
-            order_to_customer_natural = dict(zip(sales["order_id"], sales["customer_id"]))
-            if "customer_id" in mappings:
-                order_to_customer_key = {o: mappings["customer_id"].get(c) for o, c in order_to_customer_natural.items()}
-        if "channel_id" in sales.columns:
-            order_to_channel_natural = dict(zip(sales["order_id"], sales["channel_id"]))
-            if "channel_id" in mappings:
-                order_to_channel_key = {o: mappings["channel_id"].get(ch) for o, ch in order_to_channel_natural.items()}
-        if "store_id" in sales.columns:
-            order_to_store_natural = dict(zip(sales["order_id"], sales["store_id"]))
-            if "store_id" in mappings:
-                order_to_store_key = {o: mappings["store_id"].get(s) for o, s in order_to_store_natural.items()}
+    def build_dim_date():
+        # Only the event timestamps are read, so a change to one dated table
+        # does not pull the others into a cached rebuild.
+        sources = [read_staging(name, staging_dir, fmt, list(ROLE_DATE_KEYS)) for name in DATED_STAGING]
+        stamps = [pd.to_datetime(df[c], errors="coerce") for df in sources for c in ROLE_DATE_KEYS if c in df.columns]
+        bounds = [ts.agg(["min", "max"]) for ts in stamps if ts.notna().any()]
+        path = table_path(dw_dir, "dim_date", fmt)
+        if incremental and path.exists():
+            # Never shrink the calendar facts from earlier runs point into.
+            keys = read_table(dw_dir, "dim_date", fmt, columns=["date_key"])["date_key"]
+            bounds.append(pd.to_datetime(keys.agg(["min", "max"]).astype(str), format="%Y%m%d"))
+        if not bounds:
+            print("dim_date skipped (no dated facts)")
+            return
+        dim_date = build_calendar(min(b.iloc[0] for b in bounds), max(b.iloc[1] for b in bounds))
+        write_table(compact_keys(dim_date), dw_dir, "dim_date", fmt)
+        print(f"Wrote dim_date ({len(dim_date)} rows, {dim_date['date'].iloc[0]} to {dim_date['date'].iloc[-1]})")
+
+    # One order_id -> (customer, channel, store, order date) key frame shared
+    # by every order-level fact.
+    def build_bridge(sales: pd.DataFrame) -> pd.DataFrame:
+        if sales.empty or "order_id" not in sales.columns:
+            return pd.DataFrame()
+        return build_order_bridge(sales, keys_for)
+
+    def build_fact_sales_order(sales: pd.DataFrame, order_bridge: pd.DataFrame):
+        if not sales.empty:
+            fact_sales = new_rows(sales, "fact_sales_order").copy()
+            keep = [c for c in ["order_id", "customer_id", "channel_id", "store_id", "total_amount", "order_date"] if c in fact_sales.columns]
+            fact_sales = fact_sales[keep]
+            if "order_id" in fact_sales.columns:
+                fact_sales["order_key"] = registry("order_id").assign(fact_sales["order_id"])
+            fact_sales = attach_order_bridge(fact_sales, order_bridge)
+            fact_sales = add_date_keys(fact_sales)
+            drop_cols = [c for c in ["order_id", "customer_id", "channel_id", "store_id"] if c in fact_sales.columns]
+            fact_sales = fact_sales.drop(columns=drop_cols)
+            cols = [c for c in ["order_key"] if c in fact_sales.columns]
+            cols += [c for c in ["customer_key", "channel_key", "store_key", "order_date_key"] if c in fact_sales.columns]
+            cols += [c for c in fact_sales.columns if c.endswith("_date_key") and c not in cols]
+            cols += [c for c in fact_sales.columns if c not in cols]
+            fact_sales = fact_sales[cols]
+            return write_fact(fact_sales, "fact_sales_order", "order_key")
+        else:
+            print("fact_sales_order skipped (no sales orders)")
 
     
-    if not payments.empty:
-        fact_payments = payments.copy()
-        keep = [c for c in ["payment_id", "order_id", "amount", "created_at", "method", "status", "paid_at", "transaction_ref"] if c in fact_payments.columns]
-        fact_payments = fact_payments[keep]
-        if "payment_id" in fact_payments.columns:
-            pay_map = make_mapping(fact_payments["payment_id"])
-            mappings["payment_id"] = pay_map
-            fact_payments["payment_key"] = fact_payments["payment_id"].map(pay_map).astype(pd.Int64Dtype())
-        if "order_id" in fact_payments.columns:
-            if order_to_customer_key:
-                fact_payments["customer_key"] = fact_payments["order_id"].map(order_to_customer_key).astype(pd.Int64Dtype())
-            if order_to_channel_key:
-                fact_payments["channel_key"] = fact_payments["order_id"].map(order_to_channel_key).astype(pd.Int64Dtype())
-            if order_to_store_key:
-                fact_payments["store_key"] = fact_payments["order_id"].map(order_to_store_key).astype(pd.Int64Dtype())
-        drop_cols = [c for c in ["payment_id", "order_id"] if c in fact_payments.columns]
-        fact_payments = fact_payments.drop(columns=drop_cols)
-        cols = [c for c in ["payment_key"] if c in fact_payments.columns]
-        cols += [c for c in ["customer_key", "channel_key", "store_key"] if c in fact_payments.columns]
-        cols += [c for c in fact_payments.columns if c not in cols]
-        fact_payments = fact_payments[cols]
-        fact_payments.to_csv(dw_dir / "fact_payments.csv", index=False)
-        print(f"Wrote fact_payments ({len(fact_payments)} rows)")
-    else:
-        print("fact_payments skipped (no payments)")
+    def build_fact_payments(payments: pd.DataFrame, order_bridge: pd.DataFrame):
+        if not payments.empty:
+            fact_payments = new_rows(payments, "fact_payments").copy()
+            keep = [c for c in ["payment_id", "order_id", "amount", "created_at", "method", "status", "paid_at", "transaction_ref"] if c in fact_payments.columns]
+            fact_payments = fact_payments[keep]
+            if "payment_id" in fact_payments.columns:
+                fact_payments["payment_key"] = registry("payment_id").assign(fact_payments["payment_id"])
+            fact_payments = attach_order_bridge(fact_payments, order_bridge)
+            fact_payments = add_date_keys(fact_payments)
+            drop_cols = [c for c in ["payment_id", "order_id"] if c in fact_payments.columns]
+            fact_payments = fact_payments.drop(columns=drop_cols)
+            cols = [c for c in ["payment_key"] if c in fact_payments.columns]
+            cols += [c for c in ["customer_key", "channel_key", "store_key", "order_date_key"] if c in fact_payments.columns]
+            cols += [c for c in fact_payments.columns if c.endswith("_date_key") and c not in cols]
+            cols += [c for c in fact_payments.columns if c not in cols]
+            fact_payments = fact_payments[cols]
+            return write_fact(fact_payments, "fact_payments", "payment_key")
+        else:
+            print("fact_payments skipped (no payments)")
 
     
-    if not sales_item.empty:
-        fact_items = sales_item.copy()
-        keep = [c for c in ["order_item_id", "order_id", "product_id", "quantity", "unit_price"] if c in fact_items.columns]
-        fact_items = fact_items[keep]
-        if "order_item_id" in fact_items.columns:
-            oi_map = make_mapping(fact_items["order_item_id"])
-            mappings["order_item_id"] = oi_map
-            fact_items["order_item_key"] = fact_items["order_item_id"].map(oi_map).astype(pd.Int64Dtype())
-        if "order_id" in fact_items.columns:
-            if order_to_customer_key:
-                fact_items["customer_key"] = fact_items["order_id"].map(order_to_customer_key).astype(pd.Int64Dtype())
-            if order_to_channel_key:
-                fact_items["channel_key"] = fact_items["order_id"].map(order_to_channel_key).astype(pd.Int64Dtype())
-            if order_to_store_key:
-                fact_items["store_key"] = fact_items["order_id"].map(order_to_store_key).astype(pd.Int64Dtype())
-        if "product_id" in fact_items.columns and "product_id" in mappings:
-            fact_items["product_key"] = fact_items["product_id"].map(mappings["product_id"]).astype(pd.Int64Dtype())
-        drop_cols = [c for c in ["order_item_id", "order_id", "product_id"] if c in fact_items.columns]
-        fact_items = fact_items.drop(columns=drop_cols)
-        cols = [c for c in ["order_item_key"] if c in fact_items.columns]
-        cols += [c for c in ["customer_key", "channel_key", "store_key"] if c in fact_items.columns]
-        cols += [c for c in ["product_key"] if c in fact_items.columns]
-        cols += [c for c in fact_items.columns if c not in cols]
-        fact_items = fact_items[cols]
-        fact_items.to_csv(dw_dir / "fact_sales_order_item.csv", index=False)
-        print(f"Wrote fact_sales_order_item ({len(fact_items)} rows)")
-    else:
-        print("fact_sales_order_item skipped (no sales order items)")
+    def build_fact_sales_order_item(sales_item: pd.DataFrame, sales: pd.DataFrame, order_bridge: pd.DataFrame):
+        if not sales_item.empty:
+            fact_items = sales_item.copy()
+            if incremental and "order_id" in fact_items.columns:
+                fact_items = fact_items[fact_items["order_id"].isin(new_rows(sales, "fact_sales_order")["order_id"])]
+            keep = [c for c in ["order_item_id", "order_id", "product_id", "quantity", "unit_price"] if c in fact_items.columns]
+            fact_items = fact_items[keep]
+            if "order_item_id" in fact_items.columns:
+                fact_items["order_item_key"] = registry("order_item_id").assign(fact_items["order_item_id"])
+            fact_items = attach_order_bridge(fact_items, order_bridge)
+            if "product_id" in fact_items.columns:
+                # Products are resolved as of the date the order was placed.
+                order_dates = sales.drop_duplicates(subset=["order_id"]).set_index("order_id")["order_date"] if "order_date" in sales.columns else pd.Series(dtype="datetime64[ns]")
+                keys = keys_for("product_id", fact_items["product_id"], pd.Series(order_dates.reindex(fact_items["order_id"]).to_numpy(), index=fact_items.index))
+                if keys is not None:
+                    fact_items["product_key"] = keys
+            fact_items = add_date_keys(fact_items)
+            drop_cols = [c for c in ["order_item_id", "order_id", "product_id"] if c in fact_items.columns]
+            fact_items = fact_items.drop(columns=drop_cols)
+            cols = [c for c in ["order_item_key"] if c in fact_items.columns]
+            cols += [c for c in ["customer_key", "channel_key", "store_key", "order_date_key"] if c in fact_items.columns]
+            cols += [c for c in ["product_key"] if c in fact_items.columns]
+            cols += [c for c in fact_items.columns if c.endswith("_date_key") and c not in cols]
+            cols += [c for c in fact_items.columns if c not in cols]
+            fact_items = fact_items[cols]
+            return write_fact(fact_items, "fact_sales_order_item", "order_item_key")
+        else:
+            print("fact_sales_order_item skipped (no sales order items)")
 
 
 
     
-    if not shipments.empty:
-        fact_shipments = shipments.copy()
-        keep = [c for c in ["shipment_id", "order_id", "shipped_at", "delivered_at"] if c in fact_shipments.columns]
-        fact_shipments = fact_shipments[keep]
-        if "shipment_id" in fact_shipments.columns:
-            sh_map = make_mapping(fact_shipments["shipment_id"])
-            mappings["shipment_id"] = sh_map
-            fact_shipments["shipment_key"] = fact_shipments["shipment_id"].map(sh_map).astype(pd.Int64Dtype())
-        if "order_id" in fact_shipments.columns:
-            if order_to_customer_key:
-                fact_shipments["customer_key"] = fact_shipments["order_id"].map(order_to_customer_key).astype(pd.Int64Dtype())
-            if order_to_channel_key:
-                fact_shipments["channel_key"] = fact_shipments["order_id"].map(order_to_channel_key).astype(pd.Int64Dtype())
-            if order_to_store_key:
-                fact_shipments["store_key"] = fact_shipments["order_id"].map(order_to_store_key).astype(pd.Int64Dtype())
-        drop_cols = [c for c in ["shipment_id", "order_id"] if c in fact_shipments.columns]
-        fact_shipments = fact_shipments.drop(columns=drop_cols)
-        cols = [c for c in ["shipment_key"] if c in fact_shipments.columns]
-        cols += [c for c in ["customer_key", "channel_key", "store_key"] if c in fact_shipments.columns]
-        cols += [c for c in fact_shipments.columns if c not in cols]
-        fact_shipments = fact_shipments[cols]
-        fact_shipments.to_csv(dw_dir / "fact_shipments.csv", index=False)
-        print(f"Wrote fact_shipments ({len(fact_shipments)} rows)")
-    else:
-        print("fact_shipments skipped (no shipments)")
+    def build_fact_shipments(shipments: pd.DataFrame, order_bridge: pd.DataFrame):
+        if not shipments.empty:
+            fact_shipments = new_rows(shipments, "fact_shipments").copy()
+            keep = [c for c in ["shipment_id", "order_id", "shipped_at", "delivered_at"] if c in fact_shipments.columns]
+            fact_shipments = fact_shipments[keep]
+            if "shipment_id" in fact_shipments.columns:
+                fact_shipments["shipment_key"] = registry("shipment_id").assign(fact_shipments["shipment_id"])
+            fact_shipments = attach_order_bridge(fact_shipments, order_bridge)
+            fact_shipments = add_date_keys(fact_shipments)
+            drop_cols = [c for c in ["shipment_id", "order_id"] if c in fact_shipments.columns]
+            fact_shipments = fact_shipments.drop(columns=drop_cols)
+            cols = [c for c in ["shipment_key"] if c in fact_shipments.columns]
+            cols += [c for c in ["customer_key", "channel_key", "store_key", "order_date_key"] if c in fact_shipments.columns]
+            cols += [c for c in fact_shipments.columns if c.endswith("_date_key") and c not in cols]
+            cols += [c for c in fact_shipments.columns if c not in cols]
+            fact_shipments = fact_shipments[cols]
+            return write_fact(fact_shipments, "fact_shipments", "shipment_key")
+        else:
+            print("fact_shipments skipped (no shipments)")
 
     
-    if not web_sessions.empty:
-        fact_web_sessions = web_sessions.copy()
-        keep = [c for c in ["session_id", "customer_id", "started_at", "ended_at", "source", "device"] if c in fact_web_sessions.columns]
-        fact_web_sessions = fact_web_sessions[keep]
-        if "session_id" in fact_web_sessions.columns:
-            sess_map = make_mapping(fact_web_sessions["session_id"])
-            mappings["session_id"] = sess_map
-            fact_web_sessions["session_key"] = fact_web_sessions["session_id"].map(sess_map).astype(pd.Int64Dtype())
-        if "customer_id" in fact_web_sessions.columns and "customer_id" in mappings:
-            fact_web_sessions["customer_key"] = fact_web_sessions["customer_id"].map(mappings["customer_id"]).astype(pd.Int64Dtype())
-        drop_cols = [c for c in ["session_id", "customer_id"] if c in fact_web_sessions.columns]
-        fact_web_sessions = fact_web_sessions.drop(columns=drop_cols)
-        cols = [c for c in ["session_key"] if c in fact_web_sessions.columns]
-        cols += [c for c in ["customer_key"] if c in fact_web_sessions.columns]
-        cols += [c for c in fact_web_sessions.columns if c not in cols]
-        fact_web_sessions = fact_web_sessions[cols]
-        fact_web_sessions.to_csv(dw_dir / "fact_web_sessions.csv", index=False)
-        print(f"Wrote fact_web_sessions ({len(fact_web_sessions)} rows)")
-    else:
-        print("fact_web_sessions skipped (no web sessions)")
+    def build_fact_order_lifecycle(sales: pd.DataFrame, payments: pd.DataFrame, shipments: pd.DataFrame, order_bridge: pd.DataFrame):
+        if sales.empty or "order_id" not in sales.columns:
+            print("fact_order_lifecycle skipped (no sales orders)")
+            return
+        fact = order_lifecycle(sales, payments, shipments)
+        fact.insert(0, "order_key", registry("order_id").lookup(fact["order_id"]))
+        fact = attach_order_bridge(fact, order_bridge)
+        fact = add_date_keys(fact)
+        fact = fact.drop(columns=["order_id", "order_date", "paid_at", "shipped_at", "delivered_at"], errors="ignore")
+        cols = [c for c in ["order_key", "customer_key", "channel_key", "store_key", "order_date_key"] if c in fact.columns]
+        cols += [c for c in fact.columns if c.endswith("_date_key") and c not in cols]
+        cols += [c for c in fact.columns if c not in cols]
+        # Nullable key dtypes keep the hash stable whether or not a key is missing.
+        fact = compact_keys(fact[cols])
+        fact["row_hash"] = row_hash(fact, cols[1:])
+        stored = read_table(dw_dir, "fact_order_lifecycle", fmt) if incremental and table_path(dw_dir, "fact_order_lifecycle", fmt).exists() else None
+        if stored is not None and "row_hash" in stored.columns:
+            # Every order is re-derived from full staging, since a delivery or
+            # a payment status change does not move the order's own
+            # watermark; only snapshots that differ from the stored one are upserted.
+            stored = stored[["order_key", "row_hash"]]
+            unchanged = pd.MultiIndex.from_frame(fact[["order_key", "row_hash"]]).isin(pd.MultiIndex.from_frame(stored.astype("int64")))
+            fact = fact[~unchanged]
+        return write_fact(fact, "fact_order_lifecycle", "order_key")
+
+    def build_fact_web_sessions(web_sessions: pd.DataFrame):
+        if not web_sessions.empty:
+            fact_web_sessions = new_rows(web_sessions, "fact_web_sessions").copy()
+            keep = [c for c in ["session_id", "customer_id", "started_at", "ended_at", "source", "device"] if c in fact_web_sessions.columns]
+            fact_web_sessions = fact_web_sessions[keep]
+            if "session_id" in fact_web_sessions.columns:
+                fact_web_sessions["session_key"] = registry("session_id").assign(fact_web_sessions["session_id"])
+            keys = keys_for("customer_id", fact_web_sessions["customer_id"], fact_web_sessions.get("started_at")) if "customer_id" in fact_web_sessions.columns else None
+            if keys is not None:
+                fact_web_sessions["customer_key"] = keys
+            fact_web_sessions = add_date_keys(fact_web_sessions)
+            drop_cols = [c for c in ["session_id", "customer_id"] if c in fact_web_sessions.columns]
+            fact_web_sessions = fact_web_sessions.drop(columns=drop_cols)
+            cols = [c for c in ["session_key"] if c in fact_web_sessions.columns]
+            cols += [c for c in ["customer_key"] if c in fact_web_sessions.columns]
+            cols += [c for c in fact_web_sessions.columns if c.endswith("_date_key") and c not in cols]
+            cols += [c for c in fact_web_sessions.columns if c not in cols]
+            fact_web_sessions = fact_web_sessions[cols]
+            return write_fact(fact_web_sessions, "fact_web_sessions", "session_key")
+        else:
+            print("fact_web_sessions skipped (no web sessions)")
 
     
-    if not nps.empty:
-        fact_nps = nps.copy()
-        keep = [c for c in ["nps_id", "customer_id", "channel_id", "score", "responded_at"] if c in fact_nps.columns]
-        fact_nps = fact_nps[keep]
-        if "nps_id" in fact_nps.columns:
-            nps_map = make_mapping(fact_nps["nps_id"])
-            mappings["nps_id"] = nps_map
-            fact_nps["nps_key"] = fact_nps["nps_id"].map(nps_map).astype(pd.Int64Dtype())
-        if "customer_id" in fact_nps.columns and "customer_id" in mappings:
-            fact_nps["customer_key"] = fact_nps["customer_id"].map(mappings["customer_id"]).astype(pd.Int64Dtype())
-        if "channel_id" in fact_nps.columns and "channel_id" in mappings:
-            fact_nps["channel_key"] = fact_nps["channel_id"].map(mappings["channel_id"]).astype(pd.Int64Dtype())
-        drop_cols = [c for c in ["nps_id", "customer_id", "channel_id"] if c in fact_nps.columns]
-        fact_nps = fact_nps.drop(columns=drop_cols)
-        cols = [c for c in ["nps_key"] if c in fact_nps.columns]
-        cols += [c for c in ["customer_key", "channel_key"] if c in fact_nps.columns]
-        cols += [c for c in fact_nps.columns if c not in cols]
-        fact_nps = fact_nps[cols]
-        fact_nps.to_csv(dw_dir / "fact_nps.csv", index=False)
-        print(f"Wrote fact_nps ({len(fact_nps)} rows)")
-    else:
-        print("fact_nps skipped (no nps responses)")
+    def build_fact_nps(nps: pd.DataFrame):
+        if not nps.empty:
+            fact_nps = new_rows(nps, "fact_nps").copy()
+            keep = [c for c in ["nps_id", "customer_id", "channel_id", "score", "responded_at"] if c in fact_nps.columns]
+            fact_nps = fact_nps[keep]
+            if "nps_id" in fact_nps.columns:
+                fact_nps["nps_key"] = registry("nps_id").assign(fact_nps["nps_id"])
+            for natural in ["customer_id", "channel_id"]:
+                keys = keys_for(natural, fact_nps[natural], fact_nps.get("responded_at")) if natural in fact_nps.columns else None
+                if keys is not None:
+                    fact_nps[natural.replace("_id", "_key")] = keys
+            fact_nps = add_date_keys(fact_nps)
+            drop_cols = [c for c in ["nps_id", "customer_id", "channel_id"] if c in fact_nps.columns]
+            fact_nps = fact_nps.drop(columns=drop_cols)
+            cols = [c for c in ["nps_key"] if c in fact_nps.columns]
+            cols += [c for c in ["customer_key", "channel_key"] if c in fact_nps.columns]
+            cols += [c for c in fact_nps.columns if c.endswith("_date_key") and c not in cols]
+            cols += [c for c in fact_nps.columns if c not in cols]
+            fact_nps = fact_nps[cols]
+            return write_fact(fact_nps, "fact_nps", "nps_key")
+        else:
+            print("fact_nps skipped (no nps responses)")
+
+
+
+    def read(name: str) -> Node:
+        return Node(name, lambda: read_staging(name, staging_dir, fmt, STAGING_CONTRACTS.get(name), memory_report), sources=[table_path(staging_dir, name, fmt)])
+
+    def output(name: str) -> Path:
+        return partition_dir(dw_dir, name) if partition_facts and name in FACT_PARTITIONS else output_path(dw_dir, name, fmt)
+
+    dims = ["dim_customer", "dim_product", "dim_channel", "dim_store", "dim_address"]
+    nodes = [
+        read("stg_customer"),
+        read("stg_product"),
+        read("stg_channel"),
+        read("stg_store"),
+        read("stg_address"),
+        read("stg_sales_order"),
+        read("stg_sales_order_item"),
+        read("stg_payment"),
+        read("stg_shipment"),
+        read("stg_web_session"),
+        read("stg_nps_response"),
+        Node("dim_customer", build_dim_customer, ["stg_customer"]),
+        Node("dim_product", build_dim_product, ["stg_product"]),
+        Node("dim_channel", build_dim_channel, ["stg_channel"]),
+        Node("dim_store", build_dim_store, ["stg_store"]),
+        Node("dim_address", build_dim_address, ["stg_address"]),
+        Node("dim_date", build_dim_date, sources=[table_path(staging_dir, name, fmt) for name in DATED_STAGING]),
+        Node("order_bridge", build_bridge, ["stg_sales_order"], after=dims),
+        Node("fact_sales_order", build_fact_sales_order, ["stg_sales_order", "order_bridge"]),
+        Node("fact_payments", build_fact_payments, ["stg_payment", "order_bridge"]),
+        Node("fact_sales_order_item", build_fact_sales_order_item, ["stg_sales_order_item", "stg_sales_order", "order_bridge"]),
+        Node("fact_shipments", build_fact_shipments, ["stg_shipment", "order_bridge"]),
+        # Order keys are assigned by fact_sales_order.
+        Node("fact_order_lifecycle", build_fact_order_lifecycle, ["stg_sales_order", "stg_payment", "stg_shipment", "order_bridge"], after=["fact_sales_order"]),
+        Node("fact_web_sessions", build_fact_web_sessions, ["stg_web_session"], after=dims),
+        Node("fact_nps", build_fact_nps, ["stg_nps_response"], after=dims),
+    ]
+    nodes += [Node(spec.name, lambda fact, spec=spec: refresh_aggregate(spec, fact, dw_dir, fmt, incremental), [spec.fact]) for spec in AGGREGATES]
+    nodes = [replace(n, outputs=[output(n.name)]) if n.name.startswith(("dim_", "fact_", "agg_")) else n for n in nodes]
+    # An aggregate rebuilt over an up-to-date fact reads the fact back rather than rebuilding it.
+    nodes = [replace(n, load=lambda name=n.name: read_fact(dw_dir, name, fmt)) if n.name.startswith("fact_") else n for n in nodes]
+
+    # Facts of a partial rebuild still look up channel keys when dim_channel
+    # is skipped as up to date; the Type 2 dimensions are read back by dim_versions.
+    if (dw_dir / KEYS_DIR / "channel_id.npz").exists():
+        registry("channel_id")
+    cache = BuildCache(dw_dir / CACHE_FILE, salt=salt, force=force)
+    results = run_dag(nodes, workers, cache)
+
+    for keys in mappings.values():
+        keys.save()
+
+    sources = {"fact_sales_order": "stg_sales_order", "fact_payments": "stg_payment", "fact_shipments": "stg_shipment", "fact_web_sessions": "stg_web_session", "fact_nps": "stg_nps_response"}
+    for fact, source in sources.items():
+        if results[source] is not None:
+            state[fact] = high_water(results[source], FACT_WATERMARKS[fact], state.get(fact))
+    save_state({k: v for k, v in state.items() if v is not None}, state_path)
+
+    if sqlite_path is not None:
+        export_sqlite(dw_dir, fmt, sqlite_path)
 
 
 def main(argv=None):
     parser = argparse.ArgumentParser(description="Build simple Kimball-style DIM and FACT CSVs from STAGING/")
     parser.add_argument("--staging-dir", default=str(Path(__file__).resolve().parents[1] / "STAGING"), help="Path to STAGING folder")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv", help="Format of the STAGING inputs and DW outputs")
     parser.add_argument("--dw-dir", default=str(Path(__file__).resolve().parents[1] / "DW"), help="Path to write DW files (dimensions and facts)")
+    parser.add_argument("--incremental", action="store_true", help="Only load staging rows newer than the fact watermarks of the previous run and upsert them")
+    parser.add_argument("--workers", type=int, default=1, help="Build independent dimensions and facts concurrently on N threads")
+    parser.add_argument("--memory-report", action="store_true", help="Print the in-memory size of each staging table without and with the dtype plan")
+    parser.add_argument("--partition-facts", action="store_true", help="Write dated facts as year=YYYY/month=MM partitions of their event date")
+    parser.add_argument("--sqlite", nargs="?", const="", default=None, help=f"Also load the star schema into a SQLite file (default: DW_DIR/{SQLITE_FILE})")
+    parser.add_argument("--compress", choices=sorted(CSV_CODECS), default=None, help="Compress DW outputs (CSV as .csv.gz/.csv.zst, parquet/feather internally) on a background thread")
+    parser.add_argument("--compress-level", type=int, default=None, help="Compression level for --compress (codec default if omitted)")
+    parser.add_argument("--effective-date", default=None, help="When attribute changes found by this run take effect in the Type 2 dimensions (default: now)")
+    parser.add_argument("--force", action="store_true", help="Rebuild every dimension, fact and aggregate even if its staging inputs are unchanged since the last run")
+    parser.add_argument("--manifest", default=None, help=f"JSON-lines run manifest to append step timings to (default: DW_DIR/{MANIFEST_FILE})")
+    parser.add_argument("--profile", default=None, help="Write a cProfile dump (or a pyinstrument report if the path ends in .html) of the main thread")
     args = parser.parse_args(argv)
 
     staging_dir = Path(args.staging_dir)
@@ -333,7 +482,10 @@ def main(argv=None):
     print(f"Reading staging from: {staging_dir} (only STAGING will be used)")
     print(f"Writing DW outputs to: {dw_dir}")
 
-    build_dims_and_facts(staging_dir, dw_dir)
+    manifest = Path(args.manifest) if args.manifest else dw_dir / MANIFEST_FILE
+    with run_manifest(manifest, "DimFacts", vars(args)), profiled(args.profile), compressed_output(args.compress, args.compress_level):
+        sqlite_path = None if args.sqlite is None else Path(args.sqlite or dw_dir / SQLITE_FILE)
+        build_dims_and_facts(staging_dir, dw_dir, args.format, args.incremental, args.workers, args.memory_report, sqlite_path, args.partition_facts, args.force, args.effective_date)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import pandas as pd
+
+from schemas import compact_keys
+from partitions import FACT_PARTITIONS, is_partitioned, read_fact
+from storage import read_table, table_path, write_table
+
+
+def _same(df: pd.DataFrame) -> pd.DataFrame:
+    return df
+
+
+@dataclass
+class Aggregate:
+    """A summary table over one fact, grouped by a date partition plus keys.
+
+    ``prepare`` derives the partition and measure inputs from fact columns,
+    ``finish`` adds ratios computed from the additive measures.
+    """
+
+    name: str
+    fact: str
+    partition: str
+    keys: Sequence[str]
+    measures: Dict[str, Tuple[str, str]]
+    columns: Sequence[str]
+    prepare: Callable[[pd.DataFrame], pd.DataFrame] = _same
+    finish: Callable[[pd.DataFrame], pd.DataFrame] = _same
+
+
+def _item_revenue(df: pd.DataFrame) -> pd.DataFrame:
+    df["gross_revenue"] = df["quantity"] * df["unit_price"]
+    return df
+
+
+def _nps_inputs(df: pd.DataFrame) -> pd.DataFrame:
+    df["month_key"] = (df["responded_date_key"] // 100).astype("Int32")
+    df["promoter"] = (df["score"] >= 9).astype("int32")
+    df["detractor"] = (df["score"] <= 6).astype("int32")
+    return df
+
+
+def _nps_score(df: pd.DataFrame) -> pd.DataFrame:
+    df["nps"] = (100 * (df["promoters"] - df["detractors"]) / df["responses"]).round(2)
+    return df
+
+
+def _lead_times(df: pd.DataFrame) -> pd.DataFrame:
+    shipped = pd.to_datetime(df["shipped_at"], errors="coerce")
+    delivered = pd.to_datetime(df["delivered_at"], errors="coerce")
+    df["lead_time_hours"] = (delivered - shipped).dt.total_seconds() / 3600
+    return df
+
+
+def _avg_lead_time(df: pd.DataFrame) -> pd.DataFrame:
+    df["avg_lead_time_hours"] = (df["lead_time_hours_sum"] / df["delivered"].where(df["delivered"] > 0)).round(2)
+    return df
+
+
+def _avg_ticket(df: pd.DataFrame) -> pd.DataFrame:
+    df["avg_ticket"] = (df["revenue"] / df["orders"]).round(2)
+    return df
+
+
+AGGREGATES: List[Aggregate] = [
+    Aggregate(
+        "agg_daily_sales", "fact_sales_order", "order_date_key", ["channel_key", "store_key"],
+        {"orders": ("order_key", "count"), "revenue": ("total_amount", "sum")},
+        ["order_key", "order_date_key", "channel_key", "store_key", "total_amount"],
+        finish=_avg_ticket,
+    ),
+    Aggregate(
+        "agg_daily_product_sales", "fact_sales_order_item", "order_date_key", ["channel_key", "store_key", "product_key"],
+        {"lines": ("order_item_key", "count"), "units": ("quantity", "sum"), "gross_revenue": ("gross_revenue", "sum")},
+        ["order_item_key", "order_date_key", "channel_key", "store_key", "product_key", "quantity", "unit_price"],
+        prepare=_item_revenue,
+    ),
+    Aggregate(
+        "agg_monthly_nps", "fact_nps", "month_key", ["channel_key"],
+        {"responses": ("nps_key", "count"), "promoters": ("promoter", "sum"), "detractors": ("detractor", "sum"), "score_sum": ("score", "sum")},
+        ["nps_key", "responded_date_key", "channel_key", "score"],
+        prepare=_nps_inputs, finish=_nps_score,
+    ),
+    Aggregate(
+        "agg_daily_fulfillment", "fact_shipments", "shipped_date_key", ["channel_key", "store_key"],
+        {"shipments": ("shipment_key", "count"), "delivered": ("lead_time_hours", "count"), "lead_time_hours_sum": ("lead_time_hours", "sum"), "lead_time_hours_max": ("lead_time_hours", "max")},
+        ["shipment_key", "shipped_date_key", "channel_key", "store_key", "shipped_at", "delivered_at"],
+        prepare=_lead_times, finish=_avg_lead_time,
+    ),
+]
+
+
+def aggregate(spec: Aggregate, fact: pd.DataFrame) -> pd.DataFrame:
+    df = spec.prepare(fact[[c for c in spec.columns if c in fact.columns]].copy())
+    by = [spec.partition] + [k for k in spec.keys if k in df.columns]
+    grouped = df.groupby(by, dropna=False, observed=True, sort=True).agg(**spec.measures).reset_index()
+    return spec.finish(grouped)
+
+
+def fact_window(spec: Aggregate, delta: pd.DataFrame, dw_dir: Path) -> dict:
+    # With a partitioned fact only the months the delta falls in are opened.
+    column = FACT_PARTITIONS.get(spec.fact)
+    if column is None or column not in delta.columns or not is_partitioned(dw_dir, spec.fact):
+        return {}
+    days = pd.to_datetime(delta[column].dropna().astype(str), format="%Y%m%d")
+    if days.empty:
+        return {}
+    return {"start": days.min().replace(day=1), "end": days.max() + pd.offsets.MonthEnd(0), "undated": True}
+
+
+def refresh_aggregate(spec: Aggregate, delta: Optional[pd.DataFrame], dw_dir: Path, fmt: str = "csv", incremental: bool = False) -> Optional[pd.DataFrame]:
+    if delta is None:
+        return None
+    path = table_path(dw_dir, spec.name, fmt)
+    if not incremental:
+        result = aggregate(spec, delta)
+        write_table(compact_keys(result), dw_dir, spec.name, fmt)
+        print(f"Wrote {spec.name} ({len(result)} rows)")
+        return result
+
+    # The fact file already holds this run's upserts; only the partitions the
+    # delta touches are re-aggregated from it. Open rows (no date yet) live in
+    # the null partition, which is always refreshed since they can leave it.
+    fact = spec.prepare(read_fact(dw_dir, spec.fact, fmt, spec.columns, **fact_window(spec, delta, dw_dir)))
+    if not path.exists():
+        result = aggregate(spec, fact)
+        write_table(compact_keys(result), dw_dir, spec.name, fmt)
+        print(f"Wrote {spec.name} ({len(result)} rows)")
+        return result
+    affected = spec.prepare(delta[[c for c in spec.columns if c in delta.columns]].copy())[spec.partition].dropna().unique()
+    in_scope = fact[spec.partition].isin(affected) | fact[spec.partition].isna()
+    fresh = aggregate(spec, fact[in_scope])
+    existing = read_table(dw_dir, spec.name, fmt)
+    stale = existing[spec.partition].isin(affected) | existing[spec.partition].isna()
+    by = [spec.partition] + [k for k in spec.keys if k in fresh.columns]
+    result = pd.concat([existing[~stale], fresh], ignore_index=True).sort_values(by, kind="stable").reset_index(drop=True)
+    write_table(compact_keys(result), dw_dir, spec.name, fmt)
+    print(f"Refreshed {spec.name} ({len(affected)} partitions, {len(fresh)} rows)")
+    return result
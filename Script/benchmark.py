@@ -0,0 +1,109 @@
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+
+from storage import FORMATS
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_stage(cmd, log_path: Path):
+    # Each stage runs in its own process so its peak RSS is its own; wait4
+    # returns the rusage of exactly that child.
+    start = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen([sys.executable] + [str(c) for c in cmd], cwd=SCRIPT_DIR, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is in KiB on Linux and in bytes on macOS.
+            peak = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        else:
+            proc.wait()
+            peak = None
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{cmd[0]} failed with exit code {proc.returncode}, see {log_path}")
+    return seconds, peak
+
+
+def benchmark(scale: float, work_dir: Path, seed: int = 42, fmt: str = "csv", workers: int = 1, chunk_rows: int = None):
+    raw_dir, staging_dir, dw_dir = work_dir / "raw", work_dir / "STAGING", work_dir / "DW"
+    staging_cmd = ["Desnormalizador.py", "--raw-dir", raw_dir, "--staging-dir", staging_dir, "--format", fmt, "--workers", workers]
+    if chunk_rows:
+        staging_cmd += ["--chunk-rows", chunk_rows]
+    stages = [
+        ("generate", ["generate_data.py", "--out-dir", raw_dir, "--scale", scale, "--seed", seed]),
+        ("staging", staging_cmd),
+        ("dw", ["DimFacts.py", "--staging-dir", staging_dir, "--dw-dir", dw_dir, "--format", fmt, "--workers", workers]),
+    ]
+    for stage, cmd in stages:
+        seconds, peak = run_stage(cmd, work_dir / f"{stage}.log")
+        if stage == "generate":
+            orders = sum(1 for _ in open(raw_dir / "sales_order.csv", encoding="utf-8")) - 1
+        yield {"stage": stage, "seconds": round(seconds, 3), "peak_rss_mb": round(peak / 2**20, 1) if peak else None, "orders": orders}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the generator, staging and DW stages at several data scales")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10], help="Scale factors to benchmark (1 = ~12k orders)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for the synthetic data")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv", help="Staging and DW file format")
+    parser.add_argument("--workers", type=int, default=1, help="Threads for the staging and DW builds")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="Stream the staging build in chunks of N rows")
+    parser.add_argument("--work-dir", default=None, help="Where to put generated data (default: a temporary folder, removed afterwards)")
+    parser.add_argument("--output", default="benchmarks.jsonl", help="JSON-lines file the results are appended to")
+    args = parser.parse_args(argv)
+
+    base = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix="mkt_bench_"))
+    run = {
+        "run_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "format": args.format,
+        "workers": args.workers,
+        "chunk_rows": args.chunk_rows,
+        "seed": args.seed,
+    }
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            for scale in args.scales:
+                work_dir = base / f"x{scale:g}"
+                work_dir.mkdir(parents=True, exist_ok=True)
+                for result in benchmark(scale, work_dir, args.seed, args.format, args.workers, args.chunk_rows):
+                    record = {**run, "scale": scale, **result}
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    print(f"x{scale:g} {result['stage']:<8} {result['seconds']:>9.2f}s  peak {result['peak_rss_mb']} MiB")
+                if not args.work_dir:
+                    shutil.rmtree(work_dir)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(base, ignore_errors=True)
+    print(f"✅ Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"Fatal error: {e}")
+        sys.exit(1)
@@ -0,0 +1,91 @@
+from pathlib import Path
+from typing import Dict, Iterable
+import hashlib
+import json
+import sys
+import zipfile
+
+CACHE_FILE = "_build_cache.json"
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+
+def code_version() -> str:
+    # Any change to a pipeline module loaded from Script/ invalidates the cache.
+    digest = hashlib.sha256()
+    files = sorted({Path(m.__file__).resolve() for m in list(sys.modules.values()) if getattr(m, "__file__", None)})
+    for path in [p for p in files if p.parent == SCRIPT_DIR and p.suffix == ".py"]:
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def options_salt(**options) -> str:
+    # Every option that changes what a table's files contain belongs here;
+    # options that only change how fast they are built (workers, chunk size) do not.
+    return "|".join(f"{name}={value}" for name, value in sorted(options.items()))
+
+
+class BuildCache:
+    """Fingerprints of the inputs each table was last built from.
+
+    A table's fingerprint covers the content of every source file it depends
+    on, the pipeline code and the options in ``salt``. File digests are
+    remembered by size and mtime so unchanged inputs are not re-hashed.
+    """
+
+    def __init__(self, path: Path, salt: str = "", force: bool = False):
+        self.path = Path(path)
+        self.salt = salt
+        self.force = force
+        self.code = code_version()
+        state = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        self.files: Dict[str, list] = state.get("files", {})
+        # target -> [fingerprint, outputs that existed after the build]
+        self.targets: Dict[str, list] = state.get("targets", {})
+
+    def file_digest(self, path: Path) -> str:
+        if isinstance(path, zipfile.Path):
+            # Archive members carry their own CRC, so the archive is not re-read.
+            try:
+                info = path.root.getinfo(path.at)
+            except KeyError:
+                return "missing"
+            return f"zip:{info.CRC:08x}:{info.file_size}"
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            return "missing"
+        seen = self.files.get(str(path))
+        if seen and seen[0] == stat.st_size and seen[1] == stat.st_mtime_ns:
+            return seen[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        self.files[str(path)] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def fingerprint(self, name: str, sources: Iterable[Path], version: str = "") -> str:
+        digest = hashlib.sha256(f"{name}|{version}|{self.salt}|{self.code}".encode())
+        for path in sorted(sources, key=str):
+            digest.update(f"{path}={self.file_digest(path)}".encode())
+        return digest.hexdigest()
+
+    def fresh(self, name: str, fingerprint: str) -> bool:
+        # Tables skipped for lack of data leave no file and stay cached as such.
+        built = self.targets.get(name)
+        return not self.force and built is not None and built[0] == fingerprint and all(Path(p).exists() for p in built[1])
+
+    def record(self, name: str, fingerprint: str, outputs: Iterable[Path]):
+        self.targets[name] = [fingerprint, [str(p) for p in outputs if Path(p).exists()]]
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "targets": self.targets}, f, indent=1, sort_keys=True)
+        tmp.replace(self.path)
@@ -0,0 +1,104 @@
+from typing import Iterable
+import numpy as np
+import pandas as pd
+
+# Fact timestamp -> role-playing key into dim_date.
+ROLE_DATE_KEYS = {
+    "order_date": "order_date_key",
+    "paid_at": "paid_date_key",
+    "shipped_at": "shipped_date_key",
+    "delivered_at": "delivered_date_key",
+    "responded_at": "responded_date_key",
+    "started_at": "started_date_key",
+}
+
+MONTH_NAMES = np.array(["Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"])
+DAY_NAMES = np.array(["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"])
+
+FIXED_HOLIDAYS = {
+    (1, 1): "Año Nuevo",
+    (3, 24): "Día Nacional de la Memoria por la Verdad y la Justicia",
+    (4, 2): "Día del Veterano y de los Caídos en la Guerra de Malvinas",
+    (5, 1): "Día del Trabajador",
+    (5, 25): "Día de la Revolución de Mayo",
+    (6, 20): "Paso a la Inmortalidad del General Manuel Belgrano",
+    (7, 9): "Día de la Independencia",
+    (12, 8): "Inmaculada Concepción de María",
+    (12, 25): "Navidad",
+}
+# Law 27.399: these move to a Monday when they fall Tuesday to Friday.
+MOVABLE_HOLIDAYS = {
+    (6, 17): "Paso a la Inmortalidad del General Martín Miguel de Güemes",
+    (8, 17): "Paso a la Inmortalidad del General José de San Martín",
+    (10, 12): "Día del Respeto a la Diversidad Cultural",
+    (11, 20): "Día de la Soberanía Nacional",
+}
+EASTER_HOLIDAYS = {-48: "Carnaval", -47: "Carnaval", -2: "Viernes Santo"}
+
+
+def date_key(values) -> pd.Series:
+    ts = pd.to_datetime(pd.Series(values), errors="coerce")
+    return (ts.dt.year * 10_000 + ts.dt.month * 100 + ts.dt.day).astype("Int32")
+
+
+def add_date_keys(df: pd.DataFrame) -> pd.DataFrame:
+    for column, key in ROLE_DATE_KEYS.items():
+        if column in df.columns and key not in df.columns:
+            df[key] = date_key(df[column]).to_numpy()
+    return df
+
+
+def easter_sundays(years: np.ndarray) -> pd.DatetimeIndex:
+    # Anonymous Gregorian algorithm, evaluated for all years at once.
+    y = np.asarray(years)
+    a, b, c = y % 19, y // 100, y % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return pd.to_datetime(pd.DataFrame({"year": y, "month": month, "day": day}))
+
+
+def argentine_holidays(years: Iterable[int]) -> pd.Series:
+    years = np.asarray(sorted(set(years)))
+    parts = []
+    for (month, day), name in {**FIXED_HOLIDAYS, **MOVABLE_HOLIDAYS}.items():
+        dates = pd.to_datetime(pd.DataFrame({"year": years, "month": month, "day": day}))
+        if (month, day) in MOVABLE_HOLIDAYS:
+            shift = dates.dt.dayofweek.map({1: -1, 2: -2, 3: 4, 4: 3}).fillna(0)
+            dates = dates + pd.to_timedelta(shift, unit="D")
+        parts.append(pd.Series(name, index=pd.DatetimeIndex(dates)))
+    easter = easter_sundays(years)
+    for offset, name in EASTER_HOLIDAYS.items():
+        parts.append(pd.Series(name, index=pd.DatetimeIndex(easter + pd.Timedelta(days=offset))))
+    holidays = pd.concat(parts).sort_index()
+    return holidays[~holidays.index.duplicated()]
+
+
+def build_calendar(start, end) -> pd.DataFrame:
+    """One row per day, from Jan 1 of ``start``'s year to Dec 31 of ``end``'s."""
+    dates = pd.date_range(f"{pd.Timestamp(start).year}-01-01", f"{pd.Timestamp(end).year}-12-31", freq="D")
+    iso = dates.isocalendar()
+    dow = dates.dayofweek.to_numpy()
+    holiday = argentine_holidays(range(dates[0].year, dates[-1].year + 1)).reindex(dates)
+    return pd.DataFrame({
+        "date_key": date_key(dates).to_numpy(),
+        "date": dates.strftime("%Y-%m-%d"),
+        "year": dates.year.astype("int16"),
+        "quarter": dates.quarter.astype("int8"),
+        "month": dates.month.astype("int8"),
+        "month_name": MONTH_NAMES[dates.month - 1],
+        "iso_year": iso["year"].to_numpy().astype("int16"),
+        "iso_week": iso["week"].to_numpy().astype("int8"),
+        "day_of_month": dates.day.astype("int8"),
+        "day_of_week": (dow + 1).astype("int8"),
+        "day_name": DAY_NAMES[dow],
+        "is_weekend": dow >= 5,
+        "is_holiday": holiday.notna().to_numpy(),
+        "holiday_name": holiday.to_numpy(),
+    })
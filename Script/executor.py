@@ -0,0 +1,159 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from build_cache import BuildCache
+from storage import flush_writes
+from instrumentation import step
+
+
+@dataclass
+class Node:
+    """One table build: ``func`` is called with the results of ``inputs``.
+
+    ``after`` lists nodes that must finish first without passing their
+    result along (e.g. a fact that needs a dimension's keys registered).
+    ``sources`` are files the node reads and ``outputs`` the files it writes;
+    with a build cache, a node with outputs is skipped when nothing it
+    depends on changed. ``load`` reads such a node's result back from its
+    outputs, for when a node that does run consumes it.
+    """
+
+    name: str
+    func: Callable[..., Any]
+    inputs: Sequence[str] = ()
+    after: Sequence[str] = ()
+    sources: Sequence[Path] = ()
+    outputs: Sequence[Path] = ()
+    version: str = ""
+    load: Optional[Callable[[], Any]] = None
+
+    @property
+    def deps(self) -> List[str]:
+        return list(self.inputs) + list(self.after)
+
+
+def topological_order(nodes: Iterable[Node]) -> List[Node]:
+    nodes = list(nodes)
+    by_name: Dict[str, Node] = {}
+    for node in nodes:
+        if node.name in by_name:
+            raise ValueError(f"Duplicate node: {node.name}")
+        by_name[node.name] = node
+    for node in nodes:
+        for dep in node.deps:
+            if dep not in by_name:
+                raise ValueError(f"Node {node.name} depends on unknown node {dep}")
+
+    order: List[Node] = []
+    done = set()
+    remaining = nodes
+    while remaining:
+        ready = [n for n in remaining if all(d in done for d in n.deps)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between: {', '.join(n.name for n in remaining)}")
+        order += ready
+        done.update(n.name for n in ready)
+        remaining = [n for n in remaining if n.name not in done]
+    return order
+
+
+def _call(node: Node, *args) -> Any:
+    with step("node", node.name) as record:
+        result = node.func(*args)
+        if hasattr(result, "__len__") and hasattr(result, "columns"):
+            record["rows_out"] = len(result)
+    return result
+
+
+def plan_cached(order: List[Node], cache: BuildCache) -> Tuple[Dict[str, Optional[str]], List[Node]]:
+    """Fingerprint every node with outputs and work out which nodes must run.
+
+    A target is stale when its fingerprint changed, an output is missing or
+    a target upstream of it is stale. Other nodes only run when a node that
+    runs consumes their result; skipped nodes yield None. A fresh target
+    whose result is consumed is loaded from its outputs when it has a
+    ``load``, so its own inputs are not needed; the returned plan only maps
+    the nodes that are built.
+    """
+    sources: Dict[str, Dict[str, Any]] = {}
+    stale_upstream: Dict[str, bool] = {}
+    stale: Dict[str, Optional[str]] = {}
+    for node in order:
+        sources[node.name] = {str(p): p for d in node.deps for p in sources[d].values()}
+        sources[node.name].update({str(p): p for p in node.sources})
+        upstream = any(stale_upstream[d] for d in node.deps)
+        if node.outputs:
+            fingerprint = cache.fingerprint(node.name, sources[node.name].values(), node.version)
+            if upstream or not cache.fresh(node.name, fingerprint):
+                stale[node.name] = fingerprint
+                upstream = True
+        stale_upstream[node.name] = upstream
+
+    consumed = {i for n in order for i in n.inputs}
+    needed = set(stale) | {n.name for n in order if not n.outputs and n.name not in consumed}
+    loaded = set()
+    for node in reversed(order):
+        if node.name not in needed:
+            continue
+        if node.outputs and node.name not in stale and node.load is not None:
+            loaded.add(node.name)
+        else:
+            needed.update(node.inputs)
+    # Skipped nodes' files are already on disk, so only "after" edges to nodes
+    # that run still constrain the order.
+    runnable = [replace(n, func=n.load, inputs=(), after=()) if n.name in loaded else replace(n, after=[d for d in n.after if d in needed]) for n in order if n.name in needed]
+    return {name: stale.get(name) for name in needed - loaded}, runnable
+
+
+def run_dag(nodes: Iterable[Node], workers: int = 1, cache: Optional[BuildCache] = None) -> Dict[str, Any]:
+    order = topological_order(nodes)
+    if cache is None:
+        return _run(order, workers)
+    plan, runnable = plan_cached(order, cache)
+    skipped = [n.name for n in order if n.name not in plan]
+    if skipped:
+        print(f"⏭️  Up to date, skipped: {', '.join(skipped)}")
+    results: Dict[str, Any] = {n.name: None for n in order}
+    results.update(_run(runnable, workers))
+    # Outputs still being compressed in the background must exist before
+    # they are recorded.
+    flush_writes()
+    outputs = {n.name: n.outputs for n in runnable}
+    for name, fingerprint in plan.items():
+        if fingerprint is not None:
+            cache.record(name, fingerprint, outputs[name])
+    cache.save()
+    return results
+
+
+def _run(order: List[Node], workers: int) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+
+    if workers <= 1:
+        for node in order:
+            results[node.name] = _call(node, *[results[i] for i in node.inputs])
+        return results
+
+    # Threads rather than processes: the nodes hand whole DataFrames to each
+    # other, and pandas/pyarrow release the GIL in parsing, joins and I/O.
+    waiting = {n.name: set(n.deps) for n in order}
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def submit_ready():
+            for node in order:
+                if node.name in waiting and not waiting[node.name]:
+                    del waiting[node.name]
+                    running[pool.submit(_call, node, *[results[i] for i in node.inputs])] = node
+
+        submit_ready()
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                node = running.pop(future)
+                results[node.name] = future.result()
+                for deps in waiting.values():
+                    deps.discard(node.name)
+            submit_ready()
+    return results
@@ -0,0 +1,272 @@
+from pathlib import Path
+import argparse
+import shutil
+import sys
+import numpy as np
+import pandas as pd
+
+RAW_DIR = Path(__file__).resolve().parents[1] / "raw"
+
+# Row counts of the shipped raw/ sample; a scale factor multiplies them.
+BASE_CUSTOMERS = 1_500
+BASE_ORDERS = 12_000
+ADDRESSES_PER_CUSTOMER = 2.13
+NPS_PER_ORDER = 0.224
+TOUCHES_PER_ONLINE_ORDER = 1.8
+BROWSING_SESSIONS_PER_ORDER = 1.5
+TOUCH_WINDOW_DAYS = 14
+ORDERS_PER_BATCH = 250_000
+
+# Tables copied verbatim from raw/: they describe the business, not its volume.
+REFERENCE_TABLES = ["channel", "province", "product_category", "product", "store"]
+
+FIRST_NAMES = ["María", "Juan", "Lucas", "Mateo", "Sofía", "Tomás", "Santiago", "Camila", "Emma", "Felipe", "Lara", "Lucía", "Isabella", "Joaquín", "Franco", "Olivia", "Alex", "Valentina", "Martina", "Benjamín"]
+LAST_NAMES = ["González", "Silva", "Pérez", "Ruiz", "García", "Flores", "Sánchez", "Rodríguez", "Fernández", "Álvarez", "Gómez", "Torres", "López", "Medina", "Martínez", "Molina", "Díaz", "Rojas", "Acosta", "Romero"]
+CITIES = {1: ["CABA", "Mar del Plata", "La Plata"], 2: ["Córdoba", "Villa Carlos Paz", "Río Cuarto"], 3: ["Rafaela", "Rosario", "Santa Fe"], 4: ["Mendoza", "San Rafael", "Godoy Cruz"]}
+PROVINCE_WEIGHTS = [0.55, 0.2, 0.14, 0.11]
+COMMENTS = [None, "Entrega rápida y producto excelente", "Todo perfecto", "Podría mejorar el empaque", "Muy conforme con la calidad", "Atención muy buena", "Volvería a comprar", "Tardó un poco más de lo esperado"]
+
+ORDER_STATUS = {"FULFILLED": 0.70, "PAID": 0.15, "CANCELLED": 0.08, "REFUNDED": 0.05, "CREATED": 0.02}
+PAYMENT_STATUS = {"FULFILLED": "PAID", "PAID": "PAID", "CANCELLED": "FAILED", "REFUNDED": "REFUNDED", "CREATED": "PENDING"}
+SHIPMENT_STATUS = {"FULFILLED": "DELIVERED", "PAID": "SHIPPED", "CANCELLED": "CANCELLED", "REFUNDED": "DELIVERED", "CREATED": "READY"}
+PAYMENT_METHODS = {"CARD": 0.51, "GATEWAY": 0.25, "CASH": 0.18, "TRANSFER": 0.06}
+ONLINE_SHIPPING_FEES = {0.0: 0.14, 900.0: 0.35, 1200.0: 0.36, 1500.0: 0.15}
+SESSION_SOURCES = {"google": 0.38, "direct": 0.22, "instagram": 0.16, "facebook": 0.1, "email": 0.09, "tiktok": 0.05}
+SESSION_DEVICES = {"mobile": 0.62, "desktop": 0.32, "tablet": 0.06}
+NPS_SCORES = np.array([67, 72, 86, 104, 113, 154, 224, 413, 522, 526, 411]) / 2692
+
+CUSTOMERS_SINCE = pd.Timestamp("2023-07-01")
+ORDERS_SINCE = pd.Timestamp("2024-01-01")
+ORDERS_UNTIL = pd.Timestamp("2025-09-30 23:59:59")
+
+
+def random_timestamps(rng: np.random.Generator, n: int, start: pd.Timestamp, end: pd.Timestamp) -> pd.Series:
+    seconds = rng.integers(0, int((end - start).total_seconds()), n)
+    return pd.Series(start + pd.to_timedelta(seconds, unit="s"))
+
+
+def random_codes(rng: np.random.Generator, n: int, length: int, prefix: str) -> np.ndarray:
+    alphabet = np.frombuffer(b"ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", dtype="S1")
+    chars = alphabet[rng.integers(0, len(alphabet), (n, length))]
+    return np.char.add(prefix, chars.view(f"S{length}").ravel().astype(str))
+
+
+def choice(rng: np.random.Generator, weights: dict, n: int) -> np.ndarray:
+    p = np.array(list(weights.values()))
+    return np.array(list(weights.keys()))[rng.choice(len(weights), n, p=p / p.sum())]
+
+
+def write_csv(df: pd.DataFrame, path: Path, append: bool = False):
+    df.to_csv(path, index=False, mode="a" if append else "w", header=not append)
+
+
+def generate_customers(rng: np.random.Generator, n: int) -> pd.DataFrame:
+    ids = np.arange(1, n + 1)
+    first = np.array(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), n)]
+    last = np.array(LAST_NAMES)[rng.integers(0, len(LAST_NAMES), n)]
+    local = pd.Series(first).str.lower() + "." + pd.Series(last).str.lower() + "." + ids.astype(str)
+    phone = [f"+54 9 11 {a:04d}-{b:04d}" for a, b in zip(rng.integers(0, 10_000, n), rng.integers(0, 10_000, n))]
+    return pd.DataFrame({
+        "customer_id": ids,
+        "email": local + "@example.com",
+        "first_name": first,
+        "last_name": last,
+        "phone": phone,
+        "status": np.where(rng.random(n) < 0.944, "A", "I"),
+        "created_at": random_timestamps(rng, n, CUSTOMERS_SINCE, ORDERS_UNTIL),
+    })
+
+
+def generate_addresses(rng: np.random.Generator, n: int, stores: pd.DataFrame) -> pd.DataFrame:
+    # Store branches keep ids 1..N as in raw/; customer addresses start at 1001.
+    province = rng.choice([1, 2, 3, 4], n, p=PROVINCE_WEIGHTS)
+    city = np.array([CITIES[p][i] for p, i in zip(province, rng.integers(0, 3, n))])
+    floor = rng.integers(1, 13, n).astype(str)
+    flat = np.array(["A", "B", "C"])[rng.integers(0, 3, n)]
+    line2 = np.where(rng.random(n) < 0.5, np.char.add(np.char.add(np.char.add("Piso ", floor), " Dto "), flat), None)
+    customers = pd.DataFrame({
+        "address_id": np.arange(1001, 1001 + n),
+        "line1": np.char.add("Calle ", rng.integers(1, 10_000, n).astype(str)),
+        "line2": line2,
+        "city": city,
+        "province_id": province,
+        "postal_code": rng.integers(1000, 10_000, n),
+        "country_code": "AR",
+        "created_at": random_timestamps(rng, n, CUSTOMERS_SINCE, ORDERS_UNTIL),
+    })
+    return pd.concat([stores, customers], ignore_index=True)
+
+
+def generate_orders(rng: np.random.Generator, first_id: int, n: int, n_customers: int, address_ids: np.ndarray, prices: pd.Series, first_item_id: int):
+    order_id = np.arange(first_id, first_id + n, dtype="int64")
+    online = rng.random(n) < 0.6
+    status = choice(rng, ORDER_STATUS, n)
+    order_date = random_timestamps(rng, n, ORDERS_SINCE, ORDERS_UNTIL)
+
+    lines = rng.choice([1, 2, 3], n, p=[0.70, 0.25, 0.05])
+    item_order = np.repeat(order_id, lines)
+    m = len(item_order)
+    product_id = rng.choice(prices.index.to_numpy(), m)
+    quantity = rng.integers(1, 4, m)
+    unit_price = prices.loc[product_id].to_numpy()
+    gross = quantity * unit_price
+    discount = (gross * rng.choice([0.0, 0.02, 0.05, 0.10], m)).round(2)
+    items = pd.DataFrame({
+        "order_item_id": np.arange(first_item_id, first_item_id + m, dtype="int64"),
+        "order_id": item_order,
+        "product_id": product_id,
+        "quantity": quantity,
+        "unit_price": unit_price,
+        "discount_amount": discount,
+        "line_total": gross - discount,
+    })
+
+    subtotal = items.groupby("order_id")["line_total"].sum().reindex(order_id).to_numpy()
+    tax = (subtotal * 0.21).round(2)
+    fee = np.where(online, choice(rng, ONLINE_SHIPPING_FEES, n).astype(float), 0.0)
+    billing = address_ids[rng.integers(0, len(address_ids), n)].astype(float)
+    billing[rng.random(n) < 0.1] = np.nan
+    orders = pd.DataFrame({
+        "order_id": order_id,
+        "customer_id": rng.integers(1, n_customers + 1, n),
+        "channel_id": np.where(online, 1, 2),
+        "store_id": np.where(online, np.nan, rng.integers(1, 5, n)),
+        "order_date": order_date,
+        "billing_address_id": billing,
+        "shipping_address_id": address_ids[rng.integers(0, len(address_ids), n)],
+        "status": status,
+        "currency_code": "ARS",
+        "subtotal": subtotal,
+        "tax_amount": tax,
+        "shipping_fee": fee,
+        "total_amount": (subtotal + tax + fee).round(2),
+    })
+
+    payment_status = pd.Series(status).map(PAYMENT_STATUS).to_numpy()
+    paid = np.isin(payment_status, ["PAID", "REFUNDED"])
+    paid_at = order_date + pd.to_timedelta(rng.integers(0, 86_400, n), unit="s")
+    payments = pd.DataFrame({
+        "payment_id": order_id - 1_000_000_000 + 7_000_000_000,
+        "order_id": order_id,
+        "method": choice(rng, PAYMENT_METHODS, n),
+        "status": payment_status,
+        "amount": orders["total_amount"],
+        "paid_at": paid_at.where(paid),
+        "transaction_ref": np.where(paid, random_codes(rng, n, 12, "TX-"), None),
+    })
+
+    shipment_status = pd.Series(status).map(SHIPMENT_STATUS).to_numpy()
+    shipped = shipment_status != "CANCELLED"
+    shipped_at = order_date + pd.Timedelta(days=1)
+    shipments = pd.DataFrame({
+        "shipment_id": order_id - 1_000_000_000 + 9_000_000_000,
+        "order_id": order_id,
+        "carrier": np.where(online, "Correo Argentino", "PICKUP"),
+        "tracking_number": random_codes(rng, n, 10, "TRK-"),
+        "status": shipment_status,
+        "shipped_at": shipped_at.where(shipped),
+        "delivered_at": (shipped_at + pd.to_timedelta(rng.integers(2, 6, n), unit="D")).where(shipped),
+    })
+    return orders, items, payments, shipments
+
+
+def generate_nps(rng: np.random.Generator, first_id: int, n: int, n_customers: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "nps_id": np.arange(first_id, first_id + n, dtype="int64"),
+        "customer_id": rng.integers(1, n_customers + 1, n),
+        "channel_id": rng.integers(1, 3, n),
+        "score": rng.choice(11, n, p=NPS_SCORES / NPS_SCORES.sum()),
+        "comment": np.array(COMMENTS, dtype=object)[rng.integers(0, len(COMMENTS), n)],
+        "responded_at": random_timestamps(rng, n, ORDERS_SINCE, ORDERS_UNTIL),
+    })
+
+
+def generate_sessions(rng: np.random.Generator, first_id: int, orders: pd.DataFrame, n_customers: int) -> pd.DataFrame:
+    # Online orders are preceded by a few sessions of the same customer;
+    # browsing sessions (some anonymous) are spread over the whole period.
+    online = orders[orders["channel_id"] == 1]
+    touches = rng.poisson(TOUCHES_PER_ONLINE_ORDER, len(online))
+    before = pd.to_timedelta(rng.integers(0, TOUCH_WINDOW_DAYS * 86_400, touches.sum()), unit="s")
+    n_browsing = int(len(orders) * BROWSING_SESSIONS_PER_ORDER)
+    customer_id = np.concatenate([np.repeat(online["customer_id"].to_numpy(), touches), rng.integers(1, n_customers + 1, n_browsing)]).astype(float)
+    customer_id[len(customer_id) - n_browsing:][rng.random(n_browsing) < 0.25] = np.nan
+    started_at = pd.concat([pd.Series(np.repeat(online["order_date"].to_numpy(), touches) - before), random_timestamps(rng, n_browsing, ORDERS_SINCE, ORDERS_UNTIL)], ignore_index=True)
+    order = np.argsort(started_at.to_numpy(), kind="stable")
+    n = len(order)
+    return pd.DataFrame({
+        "session_id": np.arange(first_id, first_id + n, dtype="int64"),
+        "customer_id": pd.array(customer_id[order], dtype="Int64"),
+        "started_at": started_at.iloc[order].to_numpy(),
+        "ended_at": started_at.iloc[order].to_numpy() + pd.to_timedelta(rng.integers(30, 2_400, n), unit="s"),
+        "source": choice(rng, SESSION_SOURCES, n),
+        "device": choice(rng, SESSION_DEVICES, n),
+    })
+
+
+def generate(out_dir: Path, scale: float = 1, seed: int = 42, reference_dir: Path = RAW_DIR) -> dict:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for name in REFERENCE_TABLES:
+        shutil.copyfile(reference_dir / f"{name}.csv", out_dir / f"{name}.csv")
+
+    n_customers = max(1, int(BASE_CUSTOMERS * scale))
+    n_orders = max(1, int(BASE_ORDERS * scale))
+    counts = {}
+
+    customers = generate_customers(rng, n_customers)
+    write_csv(customers, out_dir / "customer.csv")
+    counts["customer"] = len(customers)
+    del customers
+
+    stores = pd.read_csv(reference_dir / "address.csv").query("address_id < 1001")
+    addresses = generate_addresses(rng, int(n_customers * ADDRESSES_PER_CUSTOMER), stores)
+    write_csv(addresses, out_dir / "address.csv")
+    address_ids = addresses.loc[addresses["address_id"] >= 1001, "address_id"].to_numpy()
+    counts["address"] = len(addresses)
+    del addresses
+
+    prices = pd.read_csv(reference_dir / "product.csv").set_index("product_id")["list_price"]
+    # Sessions draw from their own stream so the other tables stay the same per seed.
+    session_rng = np.random.default_rng([seed, 1])
+    next_item, next_session = 5_000_000_000, 15_000_000_000
+    for start in range(0, n_orders, ORDERS_PER_BATCH):
+        batch = min(ORDERS_PER_BATCH, n_orders - start)
+        tables = generate_orders(rng, 1_000_000_000 + start, batch, n_customers, address_ids, prices, next_item)
+        for name, df in zip(["sales_order", "sales_order_item", "payment", "shipment"], tables):
+            write_csv(df, out_dir / f"{name}.csv", append=start > 0)
+            counts[name] = counts.get(name, 0) + len(df)
+        next_item += len(tables[1])
+        sessions = generate_sessions(session_rng, next_session, tables[0], n_customers)
+        write_csv(sessions, out_dir / "web_session.csv", append=start > 0)
+        counts["web_session"] = counts.get("web_session", 0) + len(sessions)
+        next_session += len(sessions)
+
+    n_nps = int(n_orders * NPS_PER_ORDER)
+    for start in range(0, n_nps, ORDERS_PER_BATCH):
+        nps = generate_nps(rng, 13_000_000_000 + start, min(ORDERS_PER_BATCH, n_nps - start), n_customers)
+        write_csv(nps, out_dir / "nps_response.csv", append=start > 0)
+    counts["nps_response"] = n_nps
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic raw/ dataset at a multiple of the sample size")
+    parser.add_argument("--out-dir", required=True, help="Folder to write the raw CSVs to")
+    parser.add_argument("--scale", type=float, default=1, help="Scale factor over the shipped sample (1 = ~12k orders)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--reference-dir", default=str(RAW_DIR), help="Folder with the channel/province/product/store CSVs to copy")
+    args = parser.parse_args(argv)
+
+    out_dir = Path(args.out_dir)
+    counts = generate(out_dir, args.scale, args.seed, Path(args.reference_dir))
+    for name, rows in counts.items():
+        print(f"{name}: {rows} rows")
+    print(f"✅ Synthetic raw data (x{args.scale:g}) written to {out_dir}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"Fatal error: {e}")
+        sys.exit(1)
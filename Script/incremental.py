@@ -0,0 +1,104 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import pandas as pd
+
+from schemas import Schema, apply_schema
+from storage import append_table, read_table, table_path, write_table
+
+STATE_FILE = "_watermarks.json"
+
+# Raw table -> event timestamps used as its high-water mark. A row counts as
+# new once any of them passes the mark, so a shipment is re-staged when it is
+# delivered; the first one is the event that opens the row. Customers and
+# addresses are not watermarked: their attributes change in place, so they are
+# always staged as full snapshots for the Type 2 dimensions to compare against.
+RAW_WATERMARKS = {
+    "sales_order": ["order_date"],
+    "payment": ["paid_at"],
+    "shipment": ["shipped_at", "delivered_at"],
+    "web_session": ["started_at"],
+    "nps_response": ["responded_at"],
+}
+
+# DW fact -> staging timestamps that drive its incremental load.
+FACT_WATERMARKS = {
+    "fact_sales_order": ["order_date"],
+    "fact_payments": ["paid_at"],
+    "fact_shipments": ["shipped_at", "delivered_at"],
+    "fact_web_sessions": ["started_at"],
+    "fact_nps": ["responded_at"],
+}
+
+
+def load_state(path: Path) -> Dict[str, str]:
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: Dict[str, str], path: Path):
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    tmp.replace(path)
+
+
+def _latest(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    stamps = pd.concat([pd.to_datetime(df[c], errors="coerce", format="ISO8601") for c in columns], axis=1)
+    return stamps.max(axis=1)
+
+
+def newer_than(df: pd.DataFrame, columns: List[str], mark: Optional[str]) -> pd.DataFrame:
+    # Rows without their opening timestamp yet (pending payments, unshipped
+    # orders) are still open, so they are re-processed on every run.
+    columns = [c for c in columns if c in df.columns]
+    if mark is None or df.empty or not columns:
+        return df
+    opened = pd.to_datetime(df[columns[0]], errors="coerce", format="ISO8601")
+    return df[(_latest(df, columns) > pd.Timestamp(mark)) | opened.isna()]
+
+
+def high_water(df: pd.DataFrame, columns: List[str], previous: Optional[str]) -> Optional[str]:
+    columns = [c for c in columns if c in df.columns]
+    if df.empty or not columns:
+        return previous
+    latest = _latest(df, columns).max()
+    if pd.isna(latest):
+        return previous
+    if previous is not None and pd.Timestamp(previous) >= latest:
+        return previous
+    return latest.isoformat()
+
+
+def upsert(existing: pd.DataFrame, delta: pd.DataFrame, key: str) -> pd.DataFrame:
+    if existing.empty:
+        return delta.reset_index(drop=True)
+    categorical = [c for c in existing.columns if isinstance(existing[c].dtype, pd.CategoricalDtype)]
+    combined = pd.concat([existing, delta], ignore_index=True)
+    # concat falls back to object when the category sets differ.
+    for col in categorical:
+        combined[col] = combined[col].astype("category")
+    # Updated rows keep the position of their first appearance so that row
+    # order (and anything numbered from it) stays stable across runs.
+    position = combined.groupby(key, sort=False, dropna=False).ngroup()
+    latest = ~combined.duplicated(subset=[key], keep="last")
+    return combined[latest].iloc[position[latest].argsort(kind="stable")].reset_index(drop=True)
+
+
+def upsert_table(delta: pd.DataFrame, directory: Path, name: str, key: str, fmt: str = "csv", schema: Optional[Schema] = None) -> int:
+    path = table_path(directory, name, fmt)
+    if not path.exists():
+        write_table(delta, directory, name, fmt, schema)
+        return len(delta)
+    if schema:
+        delta = apply_schema(delta, schema)
+    existing_keys = read_table(directory, name, fmt, columns=[key], schema=schema)
+    # New rows only: append them, unless the table is stored under another
+    # codec than this run writes, in which case it is rewritten below.
+    if fmt == "csv" and not delta[key].isin(existing_keys[key]).any() and append_table(delta, directory, name):
+        return len(delta)
+    existing = read_table(directory, name, fmt, schema=schema)
+    write_table(upsert(existing, delta, key), directory, name, fmt, schema)
+    return len(delta)
@@ -0,0 +1,152 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+MANIFEST_FILE = "_manifest.jsonl"
+
+_active = None
+_context = threading.local()
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    # High-water mark of the resident set over the whole process lifetime.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def file_bytes(path: Path) -> Optional[int]:
+    try:
+        return Path(path).stat().st_size
+    except (OSError, TypeError):
+        return None
+
+
+class RunManifest:
+    """Appends one JSON line per instrumented step of a run to ``path``."""
+
+    def __init__(self, path: Path, script: str):
+        self.path = Path(path)
+        self.script = script
+        self.run_id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def emit(self, record: Dict[str, Any]):
+        record = {"run_id": self.run_id, "script": self.script, "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds"), **record}
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+@contextmanager
+def step(kind: str, name: str, **fields):
+    """Time one load/merge/key/write step and record it in the active manifest.
+
+    The yielded dict can be filled with rows_out, bytes_written, etc. When no
+    run is active this only yields, so the hot path pays nothing.
+    """
+    manifest = _active
+    if manifest is None:
+        yield {}
+        return
+    stack = _context.__dict__.setdefault("stack", [])
+    record = dict(fields)
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    rss0, wall0, cpu0 = rss_bytes(), time.perf_counter(), time.thread_time()
+    status = "ok"
+    try:
+        yield record
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        wall, cpu, rss1 = time.perf_counter() - wall0, time.thread_time() - cpu0, rss_bytes()
+        stack.pop()
+        manifest.emit({
+            "kind": kind,
+            "name": name,
+            "parent": parent,
+            "status": status,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            # Process-wide: with --workers > 1 other threads allocate too.
+            "rss_delta_bytes": rss1 - rss0 if rss0 is not None and rss1 is not None else None,
+            **record,
+        })
+
+
+@contextmanager
+def run_manifest(path: Path, script: str, options: Optional[Dict[str, Any]] = None):
+    global _active
+    manifest = RunManifest(path, script)
+    _active = manifest
+    with step("run", script, options=options) as record:
+        try:
+            yield manifest
+        finally:
+            record["peak_rss_bytes"] = peak_rss_bytes()
+            _active = None if _active is manifest else _active
+    manifest.close()
+
+
+@contextmanager
+def profiled(path: Optional[str]):
+    # .html -> pyinstrument flame report, anything else -> cProfile stats.
+    if not path:
+        yield
+        return
+    if str(path).endswith(".html"):
+        try:
+            from pyinstrument import Profiler
+        except ImportError as e:
+            raise RuntimeError("HTML profiles require pyinstrument (pip install pyinstrument)") from e
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            Path(path).write_text(profiler.output_html(), encoding="utf-8")
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+    print(f"Profile written to {path}")
@@ -0,0 +1,94 @@
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from instrumentation import step
+
+KEYS_DIR = "_keys"
+
+
+def _natural_values(values: pd.Series) -> np.ndarray:
+    values = values.dropna()
+    if pd.api.types.is_integer_dtype(values) or pd.api.types.is_float_dtype(values):
+        return values.to_numpy(dtype="int64")
+    return values.astype(str).to_numpy(dtype=str)
+
+
+class KeyRegistry:
+    """Persistent natural -> surrogate key assignments for one natural key.
+
+    Natural keys are kept sorted next to their surrogate keys so lookups are
+    a single searchsorted; keys that were handed out once are never reused
+    or renumbered.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        if self.path.exists():
+            with np.load(self.path) as data:
+                self.naturals = data["naturals"]
+                self.keys = data["keys"]
+        else:
+            self.naturals = np.empty(0, dtype="int64")
+            self.keys = np.empty(0, dtype="int64")
+        self.dirty = False
+
+    @classmethod
+    def open(cls, dw_dir: Path, name: str) -> "KeyRegistry":
+        return cls(Path(dw_dir) / KEYS_DIR / f"{name}.npz")
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _find(self, values: np.ndarray):
+        if not len(self.naturals):
+            return np.zeros(len(values), dtype="int64"), np.zeros(len(values), dtype=bool)
+        pos = np.searchsorted(self.naturals, values)
+        pos = np.minimum(pos, len(self.naturals) - 1)
+        return pos, self.naturals[pos] == values
+
+    def lookup(self, series: pd.Series) -> pd.Series:
+        with step("key_lookup", self.path.stem, rows_in=len(series)) as record:
+            keys = np.zeros(len(series), dtype="int64")
+            missing = np.ones(len(series), dtype=bool)
+            present = series.notna().to_numpy()
+            if present.any() and len(self.naturals):
+                pos, found = self._find(_natural_values(series))
+                hits = np.flatnonzero(present)[found]
+                keys[hits] = self.keys[pos[found]]
+                missing[hits] = False
+            record["misses"] = int(missing.sum())
+        return pd.Series(pd.arrays.IntegerArray(keys, missing), index=series.index)
+
+    def assign(self, series: pd.Series) -> pd.Series:
+        with step("keys", self.path.stem, rows_in=len(series)) as record:
+            before = len(self.keys)
+            keys = self._assign(series)
+            record["new_keys"] = len(self.keys) - before
+        return keys
+
+    def _assign(self, series: pd.Series) -> pd.Series:
+        values = _natural_values(series)
+        if len(values):
+            uniq, first = np.unique(values, return_index=True)
+            _, found = self._find(uniq)
+            # New keys are numbered in order of first appearance, continuing
+            # after the highest key ever assigned.
+            new = uniq[~found][np.argsort(first[~found], kind="stable")]
+            if len(new):
+                start = int(self.keys.max()) + 1 if len(self.keys) else 1
+                naturals = np.concatenate([self.naturals.astype(new.dtype), new])
+                keys = np.concatenate([self.keys, np.arange(start, start + len(new), dtype="int64")])
+                order = np.argsort(naturals, kind="stable")
+                self.naturals, self.keys = naturals[order], keys[order]
+                self.dirty = True
+        return self.lookup(series)
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.stem + ".tmp.npz")
+        np.savez(tmp, naturals=self.naturals, keys=self.keys)
+        tmp.replace(self.path)
+        self.dirty = False
@@ -0,0 +1,63 @@
+from typing import Dict
+import numpy as np
+import pandas as pd
+
+# Lag measure -> (from milestone, to milestone), in hours.
+LIFECYCLE_LAGS = {
+    "hours_to_pay": ("order_date", "paid_at"),
+    "hours_to_ship": ("order_date", "shipped_at"),
+    "hours_to_deliver": ("order_date", "delivered_at"),
+    "hours_in_transit": ("shipped_at", "delivered_at"),
+}
+
+# Child staging table -> (milestone timestamps, status column renamed for the fact).
+MILESTONES = {
+    "payment": (["paid_at"], "payment_status"),
+    "shipment": (["shipped_at", "delivered_at"], "shipment_status"),
+}
+
+
+def first_milestone(child: pd.DataFrame, kind: str) -> pd.DataFrame:
+    """One row per order: its earliest child, sorted by order_id."""
+    stamps, status = MILESTONES[kind]
+    columns = [c for c in ["order_id", "status"] + stamps if c in child.columns]
+    if "order_id" not in columns:
+        return pd.DataFrame({"order_id": pd.Series(dtype="int64")})
+    df = child[columns].rename(columns={"status": status})
+    for col in stamps:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+    by = ["order_id"] + stamps[:1] if stamps[0] in df.columns else ["order_id"]
+    # Unfinished children (no timestamp yet) sort after the completed ones.
+    df = df.sort_values(by, na_position="last", kind="stable")
+    return df[~df["order_id"].duplicated()].reset_index(drop=True)
+
+
+def align(order_ids: np.ndarray, milestones: pd.DataFrame) -> pd.DataFrame:
+    # Both sides are sorted by order_id, so one searchsorted pass positions
+    # every order's milestone row; orders without one get -1 (filled as NA).
+    ids = milestones["order_id"].to_numpy()
+    pos = np.searchsorted(ids, order_ids)
+    found = pos < len(ids)
+    found[found] = ids[pos[found]] == order_ids[found]
+    take = np.where(found, pos, -1)
+    return pd.DataFrame({c: milestones[c].array.take(take, allow_fill=True) for c in milestones.columns if c != "order_id"})
+
+
+def order_lifecycle(orders: pd.DataFrame, payments: pd.DataFrame, shipments: pd.DataFrame) -> pd.DataFrame:
+    """Accumulating snapshot of each order's milestones and the lags between them."""
+    lifecycle = orders[[c for c in ["order_id", "order_date"] if c in orders.columns]].drop_duplicates(subset=["order_id"])
+    lifecycle = lifecycle.sort_values("order_id", kind="stable").reset_index(drop=True)
+    if "order_date" in lifecycle.columns:
+        lifecycle["order_date"] = pd.to_datetime(lifecycle["order_date"], errors="coerce")
+    order_ids = lifecycle["order_id"].to_numpy()
+    parts: Dict[str, pd.DataFrame] = {
+        "payment": first_milestone(payments, "payment"),
+        "shipment": first_milestone(shipments, "shipment"),
+    }
+    lifecycle = pd.concat([lifecycle] + [align(order_ids, df) for df in parts.values()], axis=1)
+    for measure, (start, end) in LIFECYCLE_LAGS.items():
+        if start in lifecycle.columns and end in lifecycle.columns:
+            lag = pd.to_datetime(lifecycle[end]) - pd.to_datetime(lifecycle[start])
+            lifecycle[measure] = (lag.dt.total_seconds() / 3600).round(2)
+    return lifecycle
@@ -0,0 +1,239 @@
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+
+from schemas import compact_keys
+from partitions import read_fact
+from storage import CSV_CODECS, FORMATS, compressed_output, read_table, table_path, write_table
+from instrumentation import MANIFEST_FILE, profiled, run_manifest, step
+
+ATTRIBUTION_MODELS = ["last_touch", "first_touch", "linear"]
+
+# Minimum (r_score, f_score) per segment, checked in order; customers
+# matching none are hibernating.
+RFM_SEGMENTS = [
+    ("champions", 4, 4),
+    ("loyal", 3, 4),
+    ("new", 4, 1),
+    ("promising", 3, 1),
+    ("at_risk", 1, 3),
+]
+
+
+def customer_naturals(dim_customer: pd.DataFrame) -> pd.Series:
+    # Type 2 versions of one customer share a natural key; activity is
+    # grouped by it so attribute changes do not split a customer's history.
+    if "customer_natural_key" not in dim_customer.columns:
+        return pd.Series(dim_customer["customer_key"].to_numpy(), index=dim_customer["customer_key"].to_numpy())
+    return pd.Series(dim_customer["customer_natural_key"].to_numpy(), index=dim_customer["customer_key"].to_numpy())
+
+
+def current_keys(dim_customer: pd.DataFrame) -> pd.Series:
+    current = dim_customer[dim_customer["is_current"].astype(bool)] if "is_current" in dim_customer.columns else dim_customer
+    naturals = customer_naturals(current)
+    return pd.Series(naturals.index.to_numpy(), index=naturals.to_numpy())
+
+
+def _seconds(ts: pd.Series) -> np.ndarray:
+    return pd.to_datetime(ts, errors="coerce").astype("datetime64[s]").to_numpy().astype("int64")
+
+
+def touch_ranges(order_customers: np.ndarray, order_times: np.ndarray, session_customers: np.ndarray, session_times: np.ndarray, lookback: pd.Timedelta):
+    """Per order, the [lo, hi) slice of sessions sorted by (customer, time) in its window.
+
+    Customer and time are packed into one sortable int64 so two searchsorted
+    calls find every window at once: a per-customer as-of range lookup with
+    no cross join.
+    """
+    window = int(lookback.total_seconds())
+    t0 = min(session_times.min(), order_times.min()) - window
+    stride = max(session_times.max(), order_times.max()) - t0 + 1
+    packed = session_customers * stride + (session_times - t0)
+    lo = np.searchsorted(packed, order_customers * stride + (order_times - window - t0), side="left")
+    hi = np.searchsorted(packed, order_customers * stride + (order_times - t0), side="right")
+    return lo, hi
+
+
+def attribute_orders(orders: pd.DataFrame, sessions: pd.DataFrame, lookback: pd.Timedelta, models: Iterable[str] = ATTRIBUTION_MODELS) -> pd.DataFrame:
+    """Credit each order to the sessions of its customer in the ``lookback`` before it.
+
+    ``orders`` has order_key, customer, order_date and total_amount;
+    ``sessions`` has session_key, customer, started_at, source and device.
+    Returns one row per (order, credited session, model) with the share of
+    the order's revenue that session earns.
+    """
+    orders = orders[orders["customer"].notna() & orders["order_date"].notna()]
+    sessions = sessions[sessions["customer"].notna() & sessions["started_at"].notna()]
+    if orders.empty or sessions.empty:
+        return pd.DataFrame()
+    # Customers are coded over the sessions only; orders of customers without
+    # sessions get code -1 and an empty window.
+    codes, uniques = pd.factorize(sessions["customer"].to_numpy())
+    session_times = _seconds(sessions["started_at"])
+    by_customer_time = np.lexsort((session_times, codes))
+    sessions = sessions.iloc[by_customer_time].reset_index(drop=True)
+    codes, session_times = codes[by_customer_time], session_times[by_customer_time]
+    order_codes = pd.Index(uniques).get_indexer(orders["customer"].to_numpy())
+    order_times = _seconds(orders["order_date"])
+    lo, hi = touch_ranges(order_codes, order_times, codes, session_times, lookback)
+    touched = (order_codes >= 0) & (hi > lo)
+    orders, lo, hi = orders[touched].reset_index(drop=True), lo[touched], hi[touched]
+
+    picks: Dict[str, tuple] = {}
+    if "last_touch" in models:
+        picks["last_touch"] = (np.arange(len(orders)), hi - 1, np.ones(len(orders)))
+    if "first_touch" in models:
+        picks["first_touch"] = (np.arange(len(orders)), lo, np.ones(len(orders)))
+    if "linear" in models:
+        counts = hi - lo
+        rows = np.repeat(np.arange(len(orders)), counts)
+        # Position of each touch inside its window, added to the window start.
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        picks["linear"] = (rows, np.repeat(lo, counts) + offsets, 1 / np.repeat(counts, counts))
+
+    parts = []
+    for model, (rows, touches, credit) in picks.items():
+        order_rows = orders.iloc[rows]
+        session_rows = sessions.iloc[touches]
+        parts.append(pd.DataFrame({
+            "order_key": order_rows["order_key"].to_numpy(),
+            "session_key": session_rows["session_key"].to_numpy(),
+            "order_date_key": order_rows["order_date_key"].to_numpy() if "order_date_key" in orders.columns else pd.NA,
+            "model": model,
+            "source": session_rows["source"].to_numpy(),
+            "device": session_rows["device"].to_numpy(),
+            "hours_before_order": ((order_times[touched][rows] - session_times[touches]) / 3600).round(2),
+            "credit": credit.round(6),
+            "attributed_revenue": (order_rows["total_amount"].to_numpy() * credit).round(2),
+        }))
+    attribution = pd.concat(parts, ignore_index=True)
+    attribution.insert(0, "attribution_key", np.arange(1, len(attribution) + 1, dtype="int64"))
+    attribution["model"] = attribution["model"].astype("category")
+    return attribution
+
+
+def source_summary(attribution: pd.DataFrame) -> pd.DataFrame:
+    summary = attribution.groupby(["model", "source"], observed=True, sort=True).agg(
+        orders=("credit", "sum"), attributed_revenue=("attributed_revenue", "sum")).reset_index()
+    summary["orders"] = summary["orders"].round(2)
+    summary["attributed_revenue"] = summary["attributed_revenue"].round(2)
+    return summary
+
+
+def _quintile(values: pd.Series, ascending: bool = True) -> np.ndarray:
+    # Ranked first so ties and small customer counts still spread over 1..5.
+    pct = values.rank(method="first", ascending=ascending, pct=True).to_numpy()
+    return np.ceil(pct * 5).clip(1, 5).astype("int8")
+
+
+def rfm_scores(orders: pd.DataFrame, as_of: pd.Timestamp) -> pd.DataFrame:
+    """Recency (days), frequency and monetary value per customer, scored 1-5."""
+    orders = orders[orders["customer"].notna() & orders["order_date"].notna()]
+    rfm = orders.groupby("customer", sort=True).agg(
+        last_order=("order_date", "max"), frequency=("order_key", "nunique"), monetary=("total_amount", "sum")).reset_index()
+    rfm["recency_days"] = (as_of - pd.to_datetime(rfm["last_order"])).dt.days.astype("int32")
+    rfm["monetary"] = rfm["monetary"].round(2)
+    rfm["r_score"] = _quintile(rfm["recency_days"], ascending=False)
+    rfm["f_score"] = _quintile(rfm["frequency"])
+    rfm["m_score"] = _quintile(rfm["monetary"])
+    rfm["rfm_score"] = rfm["r_score"].astype(str) + rfm["f_score"].astype(str) + rfm["m_score"].astype(str)
+    conditions = [(rfm["r_score"] >= r) & (rfm["f_score"] >= f) for _, r, f in RFM_SEGMENTS]
+    rfm["segment"] = pd.Categorical(np.select(conditions, [name for name, _, _ in RFM_SEGMENTS], default="hibernating"))
+    return rfm.drop(columns=["last_order"])
+
+
+def cohort_retention(orders: pd.DataFrame) -> pd.DataFrame:
+    """Share of each first-order month's customers who ordered N months later.
+
+    Long format (cohort_month, months_since_first, ...); pivot on
+    months_since_first for the usual triangle.
+    """
+    orders = orders[orders["customer"].notna() & orders["order_date"].notna()]
+    dates = pd.to_datetime(orders["order_date"])
+    months = pd.DataFrame({"customer": orders["customer"].to_numpy(), "month": (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()})
+    months = months.drop_duplicates()
+    first = months.groupby("customer")["month"].transform("min")
+    months["cohort"] = first.to_numpy()
+    months["months_since_first"] = (months["month"] - months["cohort"]).astype("int32")
+    cohorts = months.groupby(["cohort", "months_since_first"], sort=True).size().rename("customers").reset_index()
+    size = cohorts["customers"].where(cohorts["months_since_first"] == 0).groupby(cohorts["cohort"]).transform("max")
+    cohorts["cohort_size"] = size.astype("int64")
+    cohorts["retention"] = (cohorts["customers"] / cohorts["cohort_size"]).round(4)
+    cohorts.insert(0, "cohort_month", ((cohorts["cohort"] // 12) * 100 + cohorts["cohort"] % 12 + 1).astype("int32"))
+    return cohorts.drop(columns=["cohort"])
+
+
+def build_marketing(dw_dir: Path, fmt: str = "csv", lookback_days: float = 7, models: Iterable[str] = ATTRIBUTION_MODELS, as_of: Optional[str] = None):
+    dim_customer = read_table(dw_dir, "dim_customer", fmt)
+    naturals = customer_naturals(dim_customer)
+    orders = read_fact(dw_dir, "fact_sales_order", fmt, columns=["order_key", "customer_key", "order_date_key", "order_date", "total_amount"])
+    orders["customer"] = orders["customer_key"].map(naturals)
+    orders["order_date"] = pd.to_datetime(orders["order_date"], errors="coerce")
+
+    if table_path(dw_dir, "fact_web_sessions", fmt).exists():
+        sessions = read_table(dw_dir, "fact_web_sessions", fmt, columns=["session_key", "customer_key", "started_at", "source", "device"])
+        sessions["customer"] = sessions["customer_key"].map(naturals)
+        with step("attribution", "fact_order_attribution", rows_in=len(orders), sessions=len(sessions)) as record:
+            attribution = attribute_orders(orders, sessions, pd.Timedelta(days=lookback_days), models)
+            record["rows_out"] = len(attribution)
+        if attribution.empty:
+            print("fact_order_attribution skipped (no orders with sessions in the lookback window)")
+        else:
+            write_table(compact_keys(attribution), dw_dir, "fact_order_attribution", fmt)
+            attributed = attribution["order_key"].nunique()
+            print(f"Wrote fact_order_attribution ({len(attribution)} rows, {attributed} of {len(orders)} orders attributed within {lookback_days:g} days)")
+            write_table(source_summary(attribution), dw_dir, "agg_attribution_source", fmt)
+            print("Wrote agg_attribution_source")
+    else:
+        print("⚠️  fact_web_sessions not found; attribution skipped")
+
+    as_of = pd.Timestamp(as_of) if as_of else orders["order_date"].max().normalize() + pd.Timedelta(days=1)
+    with step("rfm", "agg_customer_rfm", rows_in=len(orders)) as record:
+        rfm = rfm_scores(orders, as_of)
+        rfm.insert(0, "customer_key", rfm["customer"].map(current_keys(dim_customer)).astype("Int64"))
+        rfm = rfm.drop(columns=["customer"])
+        record["rows_out"] = len(rfm)
+    write_table(rfm, dw_dir, "agg_customer_rfm", fmt)
+    print(f"Wrote agg_customer_rfm ({len(rfm)} customers as of {as_of.date()})")
+
+    with step("cohorts", "agg_cohort_retention", rows_in=len(orders)) as record:
+        cohorts = cohort_retention(orders)
+        record["rows_out"] = len(cohorts)
+    write_table(cohorts, dw_dir, "agg_cohort_retention", fmt)
+    print(f"Wrote agg_cohort_retention ({cohorts['cohort_month'].nunique()} cohorts)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attribute orders to web sessions and build RFM and cohort tables next to the DW")
+    parser.add_argument("--dw-dir", default=str(Path(__file__).resolve().parents[1] / "DW"), help="DW folder built by DimFacts")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv", help="Format of the DW tables")
+    parser.add_argument("--lookback-days", type=float, default=7, help="Sessions up to this many days before an order are credited for it")
+    parser.add_argument("--models", choices=ATTRIBUTION_MODELS, nargs="+", default=ATTRIBUTION_MODELS, help="Attribution models to compute")
+    parser.add_argument("--as-of", default=None, help="Reference date for RFM recency (default: the day after the last order)")
+    parser.add_argument("--compress", choices=sorted(CSV_CODECS), default=None, help="Compress the outputs (CSV as .csv.gz/.csv.zst, parquet/feather internally) on a background thread")
+    parser.add_argument("--compress-level", type=int, default=None, help="Compression level for --compress (codec default if omitted)")
+    parser.add_argument("--manifest", default=None, help=f"JSON-lines run manifest to append step timings to (default: DW_DIR/{MANIFEST_FILE})")
+    parser.add_argument("--profile", default=None, help="Write a cProfile dump (or a pyinstrument report if the path ends in .html) of the main thread")
+    args = parser.parse_args(argv)
+
+    dw_dir = Path(args.dw_dir)
+    if not table_path(dw_dir, "dim_customer", args.format).exists():
+        print(f"❌ No DW found in {dw_dir}. Please run DimFacts first")
+        sys.exit(2)
+
+    manifest = Path(args.manifest) if args.manifest else dw_dir / MANIFEST_FILE
+    with run_manifest(manifest, "marketing", vars(args)), profiled(args.profile), compressed_output(args.compress, args.compress_level):
+        build_marketing(dw_dir, args.format, args.lookback_days, args.models, args.as_of)
+
+    print("✅ Marketing tables written to", dw_dir)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"Fatal error: {e}")
+        sys.exit(1)
@@ -0,0 +1,159 @@
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+import shutil
+import pandas as pd
+
+from calendar_dim import date_key
+from incremental import upsert
+from storage import FORMATS, flush_writes, read_table, table_path, write_table
+from instrumentation import step
+
+# Fact -> date key of its primary event; partitions are year=YYYY/month=MM.
+FACT_PARTITIONS = {
+    "fact_sales_order": "order_date_key",
+    "fact_payments": "paid_date_key",
+    "fact_shipments": "shipped_date_key",
+    "fact_nps": "responded_date_key",
+}
+
+# Rows whose event has not happened yet (pending payments, unshipped orders).
+UNDATED = "__HIVE_DEFAULT_PARTITION__"
+PART = "part"
+
+Partition = Tuple[Optional[int], Optional[int]]
+
+
+def partition_dir(dw_dir: Path, name: str) -> Path:
+    return Path(dw_dir) / name
+
+
+def is_partitioned(dw_dir: Path, name: str) -> bool:
+    return partition_dir(dw_dir, name).is_dir()
+
+
+def partition_path(dw_dir: Path, name: str, partition: Partition) -> Path:
+    year, month = partition
+    if year is None:
+        return partition_dir(dw_dir, name) / f"year={UNDATED}" / f"month={UNDATED}"
+    return partition_dir(dw_dir, name) / f"year={year}" / f"month={month:02d}"
+
+
+def partitions_of(keys: pd.Series) -> pd.Series:
+    # yyyymmdd -> yyyymm, with missing dates mapped to 0.
+    return (pd.to_numeric(keys, errors="coerce") // 100).fillna(0).astype("int64")
+
+
+def as_partition(month: int) -> Partition:
+    return (None, None) if month == 0 else (month // 100, month % 100)
+
+
+def list_partitions(dw_dir: Path, name: str, fmt: str = "csv") -> List[Partition]:
+    flush_writes()
+    found = []
+    for path in partition_dir(dw_dir, name).glob(f"year=*/month=*/{PART}{FORMATS[fmt]}*"):
+        year, month = path.parent.parent.name[len("year="):], path.parent.name[len("month="):]
+        found.append((None, None) if year == UNDATED else (int(year), int(month)))
+    return sorted(found, key=lambda p: (p[0] is not None, p))
+
+
+def _write_partition(df: pd.DataFrame, dw_dir: Path, name: str, partition: Partition, fmt: str):
+    out = partition_path(dw_dir, name, partition)
+    if df.empty:
+        shutil.rmtree(out, ignore_errors=True)
+        if out.parent.exists() and not any(out.parent.iterdir()):
+            out.parent.rmdir()
+        return
+    out.mkdir(parents=True, exist_ok=True)
+    write_table(df, out, PART, fmt)
+
+
+def write_partitioned(df: pd.DataFrame, dw_dir: Path, name: str, fmt: str = "csv") -> int:
+    column = FACT_PARTITIONS[name]
+    shutil.rmtree(partition_dir(dw_dir, name), ignore_errors=True)
+    table_path(dw_dir, name, fmt).unlink(missing_ok=True)
+    months = partitions_of(df[column])
+    with step("write_partitions", name, format=fmt, rows_in=len(df)) as record:
+        for month, part in df.groupby(months.to_numpy(), sort=True):
+            _write_partition(part, dw_dir, name, as_partition(month), fmt)
+        record["partitions"] = months.nunique()
+    return months.nunique()
+
+
+def upsert_partitioned(delta: pd.DataFrame, dw_dir: Path, name: str, key: str, fmt: str = "csv") -> int:
+    """Rewrite only the partitions the delta lands in.
+
+    A monolithic fact from an earlier unpartitioned build is converted to
+    partitions before the delta is applied.
+    Rows are re-emitted by a run only while they are open or newer than the
+    watermark, so the undated partition is the only one a row can move out
+    of; it is always part of the rewrite.
+    """
+    if not is_partitioned(dw_dir, name):
+        monolithic = table_path(dw_dir, name, fmt)
+        if not monolithic.exists():
+            return write_partitioned(delta, dw_dir, name, fmt)
+        # A fact built without --partition-facts is split into partitions
+        # first, so its history survives the switch.
+        write_partitioned(read_table(dw_dir, name, fmt), dw_dir, name, fmt)
+    months = partitions_of(delta[FACT_PARTITIONS[name]])
+    touched = set(months.unique()) | {0}
+    with step("upsert_partitions", name, format=fmt, rows_in=len(delta)) as record:
+        for month in sorted(touched):
+            partition = as_partition(month)
+            path = table_path(partition_path(dw_dir, name, partition), PART, fmt)
+            existing = read_table(path.parent, PART, fmt) if path.exists() else pd.DataFrame()
+            here = delta[(months == month).to_numpy()]
+            if not existing.empty:
+                moved = existing[key].isin(delta[key]) & ~existing[key].isin(here[key])
+                existing = existing[~moved.to_numpy()]
+            if existing.empty and here.empty:
+                continue
+            _write_partition(upsert(existing, here, key), dw_dir, name, partition, fmt)
+        record["partitions"] = len(touched)
+    return len(touched)
+
+
+def _in_range(partition: Partition, start: Optional[int], end: Optional[int]) -> bool:
+    if partition[0] is None:
+        return False
+    month = partition[0] * 100 + partition[1]
+    return (start is None or month >= start // 100) and (end is None or month <= end // 100)
+
+
+def read_fact(dw_dir: Path, name: str, fmt: str = "csv", columns: Optional[Iterable[str]] = None, start=None, end=None, undated: bool = False) -> pd.DataFrame:
+    """Read a fact, opening only the partitions that overlap ``start``..``end``.
+
+    Bounds are inclusive dates (anything ``pd.to_datetime`` accepts). Rows
+    without an event date are only returned for unbounded reads or when
+    ``undated`` is set. Monolithic (unpartitioned) facts are read whole.
+    """
+    wanted = list(columns) if columns is not None else None
+    bounded = start is not None or end is not None
+    if not is_partitioned(dw_dir, name):
+        if bounded:
+            raise ValueError(f"{name} is not partitioned; date ranges need a build with --partition-facts")
+        return read_table(dw_dir, name, fmt, columns=wanted)
+
+    column = FACT_PARTITIONS[name]
+    lo = int(date_key([start]).iloc[0]) if start is not None else None
+    hi = int(date_key([end]).iloc[0]) if end is not None else None
+    selected = [p for p in list_partitions(dw_dir, name, fmt) if not bounded or _in_range(p, lo, hi) or (undated and p[0] is None)]
+    read_columns = wanted + [column] if wanted is not None and column not in wanted else wanted
+    with step("read_partitions", name, format=fmt, partitions=len(selected)) as record:
+        parts = [read_table(partition_path(dw_dir, name, p), PART, fmt, columns=read_columns) for p in selected]
+        if not parts:
+            return pd.DataFrame(columns=wanted or [])
+        df = pd.concat(parts, ignore_index=True)
+        # concat falls back to object when the category sets differ.
+        for col in [c for c in parts[0].columns if isinstance(parts[0][c].dtype, pd.CategoricalDtype)]:
+            df[col] = df[col].astype("category")
+        if bounded:
+            keys = pd.to_numeric(df[column], errors="coerce")
+            keep = keys.between(lo if lo is not None else 0, hi if hi is not None else 99_991_231)
+            if undated:
+                keep |= keys.isna()
+            df = df[keep.to_numpy()].reset_index(drop=True)
+        if wanted is not None:
+            df = df[wanted]
+        record["rows_out"] = len(df)
+    return df
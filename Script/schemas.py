@@ -0,0 +1,145 @@
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+
+# Event ids (orders, payments, ...) need 64 bits; ids of the small reference
+# tables fit in 32. Both are nullable so foreign keys never fall back to float.
+ID = "Int64"
+FK = "Int32"
+TEXT = "string"
+CAT = "category"
+NUM = "float64"
+TS = "datetime64[ns]"
+
+Schema = Dict[str, str]
+
+RAW_SCHEMAS: Dict[str, Schema] = {
+    "channel": {"channel_id": FK, "code": CAT, "name": TEXT},
+    "province": {"province_id": FK, "name": TEXT, "code": CAT},
+    "product_category": {"category_id": FK, "name": TEXT, "parent_id": FK},
+    "customer": {"customer_id": FK, "email": TEXT, "first_name": TEXT, "last_name": TEXT, "phone": TEXT, "status": CAT, "created_at": TS},
+    "address": {"address_id": FK, "line1": TEXT, "line2": TEXT, "city": CAT, "province_id": FK, "postal_code": TEXT, "country_code": CAT, "created_at": TS},
+    "store": {"store_id": FK, "name": TEXT, "address_id": FK},
+    "product": {"product_id": FK, "sku": TEXT, "name": TEXT, "category_id": FK, "list_price": NUM, "status": CAT, "created_at": TS},
+    "sales_order": {"order_id": ID, "customer_id": FK, "channel_id": FK, "store_id": FK, "order_date": TS, "billing_address_id": FK, "shipping_address_id": FK, "status": CAT, "currency_code": CAT, "subtotal": NUM, "tax_amount": NUM, "shipping_fee": NUM, "total_amount": NUM},
+    "sales_order_item": {"order_item_id": ID, "order_id": ID, "product_id": FK, "quantity": "Int32", "unit_price": NUM, "discount_amount": NUM, "line_total": NUM},
+    "payment": {"payment_id": ID, "order_id": ID, "method": CAT, "status": CAT, "amount": NUM, "paid_at": TS, "transaction_ref": TEXT},
+    "shipment": {"shipment_id": ID, "order_id": ID, "carrier": CAT, "tracking_number": TEXT, "status": CAT, "shipped_at": TS, "delivered_at": TS},
+    "web_session": {"session_id": ID, "customer_id": FK, "started_at": TS, "ended_at": TS, "source": CAT, "device": CAT},
+    "nps_response": {"nps_id": ID, "customer_id": FK, "channel_id": FK, "score": "Int8", "comment": TEXT, "responded_at": TS},
+}
+
+
+def prefixed(schema: Schema, prefix: str) -> Schema:
+    return {f"{prefix}{c}": t for c, t in schema.items()}
+
+
+def _address_role(role: str) -> Schema:
+    return {f"{role}_address_id": FK, f"{role}_city": CAT, f"{role}_province_id": FK, f"{role}_province_name": TEXT}
+
+
+# Staging schemas mirror the merges in Desnormalizador: each stg_* table is
+# its raw table plus the prefixed columns of whatever it was joined with.
+_stg_address = {**RAW_SCHEMAS["address"], **{c: t for c, t in prefixed(RAW_SCHEMAS["province"], "province_").items() if c != "province_province_id"}}
+_stg_store = {**RAW_SCHEMAS["store"], **prefixed(_stg_address, "addr_")}
+_stg_product = {**RAW_SCHEMAS["product"], "category_name": TEXT, "parent_category_name": TEXT}
+_stg_sales_order = {
+    **RAW_SCHEMAS["sales_order"],
+    **prefixed(RAW_SCHEMAS["channel"], "channel_"),
+    **prefixed(RAW_SCHEMAS["customer"], "cust_"),
+    **prefixed(_stg_store, "store_"),
+    **_address_role("billing"),
+    **_address_role("shipping"),
+}
+
+STAGING_SCHEMAS: Dict[str, Schema] = {
+    "stg_address": _stg_address,
+    "stg_store": _stg_store,
+    "stg_product_category": {**RAW_SCHEMAS["product_category"], **prefixed(RAW_SCHEMAS["product_category"], "parent_")},
+    "stg_product": _stg_product,
+    "stg_customer": RAW_SCHEMAS["customer"],
+    "stg_channel": RAW_SCHEMAS["channel"],
+    "stg_province": RAW_SCHEMAS["province"],
+    "stg_sales_order": _stg_sales_order,
+    "stg_sales_order_item": {**RAW_SCHEMAS["sales_order_item"], **prefixed(_stg_product, "prod_"), **prefixed(_stg_sales_order, "ord_")},
+    "stg_payment": {**RAW_SCHEMAS["payment"], **prefixed(_stg_sales_order, "ord_")},
+    "stg_shipment": {**RAW_SCHEMAS["shipment"], **prefixed(_stg_sales_order, "ord_")},
+    "stg_web_session": {**RAW_SCHEMAS["web_session"], **prefixed(RAW_SCHEMAS["customer"], "cust_")},
+    "stg_nps_response": {**RAW_SCHEMAS["nps_response"], **prefixed(RAW_SCHEMAS["channel"], "channel_"), **prefixed(RAW_SCHEMAS["customer"], "cust_")},
+}
+
+# Column contract: the columns of each stg_* table that DimFacts consumes.
+# Desnormalizador projects every merge down to these (tables not listed are
+# staged with all their columns) and DimFacts reads only these.
+STAGING_CONTRACTS: Dict[str, List[str]] = {
+    "stg_address": ["address_id", "line1", "line2", "city", "province_id", "province_name", "postal_code", "country_code"],
+    "stg_product": ["product_id", "name", "category_name", "parent_category_name"],
+    "stg_sales_order": ["order_id", "customer_id", "channel_id", "store_id", "total_amount", "order_date"],
+    "stg_sales_order_item": ["order_item_id", "order_id", "product_id", "quantity", "unit_price"],
+    "stg_payment": ["payment_id", "order_id", "amount", "method", "status", "paid_at", "transaction_ref"],
+    "stg_shipment": ["shipment_id", "order_id", "status", "shipped_at", "delivered_at"],
+    "stg_web_session": ["session_id", "customer_id", "started_at", "ended_at", "source", "device"],
+    "stg_nps_response": ["nps_id", "customer_id", "channel_id", "score", "responded_at"],
+}
+
+# Raw tables whose staging table is the raw row plus joined attributes, so
+# their own columns can be pruned with usecols on read.
+RAW_STAGING = {
+    "sales_order": "stg_sales_order",
+    "sales_order_item": "stg_sales_order_item",
+    "payment": "stg_payment",
+    "shipment": "stg_shipment",
+    "web_session": "stg_web_session",
+    "nps_response": "stg_nps_response",
+}
+
+
+def raw_columns(name: str, contracts: Dict[str, List[str]], extra: Iterable[str] = ()) -> Optional[List[str]]:
+    contract = contracts.get(RAW_STAGING.get(name))
+    if contract is None:
+        return None
+    extra = set(extra)
+    return [c for c in RAW_SCHEMAS[name] if c in contract or c in extra]
+
+
+def is_timestamp(dtype: str) -> bool:
+    return dtype.startswith("datetime64")
+
+
+def apply_schema(df: pd.DataFrame, schema: Schema) -> pd.DataFrame:
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if is_timestamp(dtype):
+            if not pd.api.types.is_datetime64_any_dtype(df[col]):
+                # pandas writes an all-midnight column as bare dates, so one CSV
+                # built by appends can mix "2024-01-02" and "2024-01-01 10:00:00";
+                # an inferred format would turn the odd ones into NaT.
+                df[col] = pd.to_datetime(df[col], errors="coerce", format="ISO8601")
+        elif str(df[col].dtype) != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def compact_keys(df: pd.DataFrame) -> pd.DataFrame:
+    # Surrogate keys are dense from 1, so most fit in Int8/Int16.
+    for col in [c for c in df.columns if c.endswith("_key") and not c.endswith("_natural_key")]:
+        values = pd.to_numeric(df[col], errors="coerce")
+        top = values.abs().max()
+        if pd.isna(top):
+            continue
+        for dtype in ["Int8", "Int16", "Int32", "Int64"]:
+            if top <= np.iinfo(dtype.lower()).max:
+                df[col] = values.astype(dtype)
+                break
+    return df
+
+
+def memory_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+def report_memory(name: str, before: pd.DataFrame, after: pd.DataFrame):
+    b, a = memory_bytes(before), memory_bytes(after)
+    change = 100 * (a / b - 1) if b else 0.0
+    print(f"📦 {name}: {b / 2**10:,.1f} KiB -> {a / 2**10:,.1f} KiB ({change:+.0f}%)")
@@ -0,0 +1,145 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+import sqlite3
+import pandas as pd
+
+from schemas import compact_keys
+from partitions import read_fact
+from storage import list_tables
+
+SQLITE_FILE = "dw.sqlite"
+BATCH_ROWS = 50_000
+
+# The target is rebuilt from scratch into a temporary file and swapped in, so
+# it is safe to give up the journal and fsyncs while loading.
+LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",
+    "PRAGMA locking_mode = EXCLUSIVE",
+]
+
+
+def sqlite_type(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def sqlite_values(s: pd.Series) -> list:
+    if pd.api.types.is_datetime64_any_dtype(s):
+        s = s.dt.strftime("%Y-%m-%d %H:%M:%S")
+    missing = s.isna().to_numpy()
+    values = s.astype(object).tolist() if isinstance(s.dtype, pd.CategoricalDtype) else s.tolist()
+    if missing.any():
+        for i in missing.nonzero()[0]:
+            values[i] = None
+    return values
+
+
+def surrogate_key(df: pd.DataFrame) -> Optional[str]:
+    return next((c for c in df.columns if c.endswith("_key") and not c.endswith("_natural_key")), None)
+
+
+def referenced_dim(column: str, dims: Dict[str, str]) -> Optional[str]:
+    if column.endswith("_date_key"):
+        return "dim_date" if "dim_date" in dims else None
+    dim = "dim_" + column[: -len("_key")]
+    return dim if dim in dims else None
+
+
+def create_table(conn: sqlite3.Connection, name: str, df: pd.DataFrame, primary_key: Optional[str], dims: Dict[str, str]):
+    columns = []
+    for col in df.columns:
+        ddl = f'"{col}" {sqlite_type(df[col].dtype)}'
+        if col == primary_key:
+            ddl += " PRIMARY KEY"
+        elif col.endswith("_key") and referenced_dim(col, dims):
+            dim = referenced_dim(col, dims)
+            ddl += f' REFERENCES {dim}("{dims[dim]}")'
+        columns.append(ddl)
+    conn.execute(f"DROP TABLE IF EXISTS {name}")
+    conn.execute(f"CREATE TABLE {name} ({', '.join(columns)})")
+
+
+def insert_rows(conn: sqlite3.Connection, name: str, df: pd.DataFrame) -> int:
+    sql = f"INSERT INTO {name} VALUES ({', '.join('?' for _ in df.columns)})"
+    for start in range(0, len(df), BATCH_ROWS):
+        batch = df.iloc[start:start + BATCH_ROWS]
+        conn.executemany(sql, zip(*[sqlite_values(batch[c]) for c in batch.columns]))
+    return len(df)
+
+
+def star_view(name: str, columns: List[str], dim_columns: Dict[str, List[str]], dims: Dict[str, str]) -> Optional[str]:
+    # One view per fact joining every dimension it references; role-playing
+    # date keys join dim_date once per role.
+    select = ["f.*"]
+    joins = []
+    for col in columns[1:]:
+        dim = referenced_dim(col, dims) if col.endswith("_key") else None
+        if dim is None:
+            continue
+        role = col[: -len("_key")]
+        alias = f"d_{role}"
+        joins.append(f'LEFT JOIN {dim} {alias} ON {alias}."{dims[dim]}" = f."{col}"')
+        select += [f'{alias}."{c}" AS "{role}_{c}"' for c in dim_columns[dim] if c != dims[dim]]
+    if not joins:
+        return None
+    return f"CREATE VIEW v_{name[len('fact_'):]} AS SELECT {', '.join(select)} FROM {name} f {' '.join(joins)}"
+
+
+def dw_tables(dw_dir: Path, fmt: str) -> List[str]:
+    # Partitioned facts are folders named after the table.
+    files = list_tables(dw_dir, fmt)
+    folders = [p.name for p in Path(dw_dir).iterdir() if p.is_dir()]
+    return sorted(n for n in files + folders if n.startswith(("dim_", "fact_", "agg_")))
+
+
+def export_sqlite(dw_dir: Path, fmt: str = "csv", path: Optional[Path] = None) -> Path:
+    path = Path(path) if path else Path(dw_dir) / SQLITE_FILE
+    # Dimensions first so the facts' REFERENCES point at existing tables.
+    names = sorted(dw_tables(dw_dir, fmt), key=lambda n: not n.startswith("dim_"))
+    dims: Dict[str, str] = {}
+    columns: Dict[str, List[str]] = {}
+
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(tmp, isolation_level=None)
+    try:
+        for pragma in LOAD_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute("BEGIN")
+        for name in names:
+            # CSV reads nullable keys back as floats; keep them INTEGER columns.
+            df = compact_keys(read_fact(dw_dir, name, fmt))
+            primary_key = surrogate_key(df) if not name.startswith("agg_") else None
+            if name.startswith("dim_") and primary_key:
+                dims[name] = primary_key
+            create_table(conn, name, df, primary_key, dims)
+            rows = insert_rows(conn, name, df)
+            columns[name] = list(df.columns)
+            # Indexes are built after the bulk insert, not maintained during it.
+            if name.startswith("fact_"):
+                for col in [c for c in df.columns[1:] if c.endswith("_key")]:
+                    conn.execute(f'CREATE INDEX ix_{name}_{col} ON {name}("{col}")')
+            elif name.startswith("agg_"):
+                conn.execute(f'CREATE INDEX ix_{name}_{df.columns[0]} ON {name}("{df.columns[0]}")')
+            print(f"Loaded {name} into SQLite ({rows} rows)")
+            del df
+        for name in [n for n in names if n.startswith("fact_")]:
+            view = star_view(name, columns[name], columns, dims)
+            if view:
+                conn.execute(view)
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+    except Exception:
+        conn.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    conn.close()
+    tmp.replace(path)
+    print(f"✅ SQLite warehouse written to {path}")
+    return path
@@ -0,0 +1,304 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import gzip
+import threading
+import zipfile
+import pandas as pd
+
+from schemas import Schema, apply_schema, is_timestamp
+from instrumentation import file_bytes, step
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+# CSVs may be stored compressed next to (or instead of) the plain file.
+CSV_CODECS = {"gzip": ".gz", "zstd": ".zst"}
+
+_output = {"codec": None, "level": None}
+_writer: Optional[ThreadPoolExecutor] = None
+_pending: Dict[tuple, Future] = {}
+_pending_lock = threading.Lock()
+
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError("parquet/feather formats require pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def is_archive(directory: Path) -> bool:
+    return Path(directory).suffix == ".zip" and Path(directory).is_file()
+
+
+def _variants(directory: Path, name: str, fmt: str) -> List[Path]:
+    plain = Path(directory) / f"{name}{FORMATS[fmt]}"
+    if fmt != "csv":
+        return [plain]
+    return [plain] + [plain.with_name(plain.name + suffix) for suffix in CSV_CODECS.values()]
+
+
+def table_path(directory: Path, name: str, fmt: str = "csv"):
+    """Where ``name`` is stored: the plain file, a compressed .csv.gz/.csv.zst,
+    or a member of a .zip archive given as ``directory``."""
+    wait_for(directory, name)
+    if is_archive(directory):
+        return zipfile.Path(directory, f"{name}{FORMATS[fmt]}")
+    variants = _variants(directory, name, fmt)
+    return next((p for p in variants if p.exists()), variants[0])
+
+
+def output_path(directory: Path, name: str, fmt: str = "csv") -> Path:
+    # Where the next write_table of ``name`` goes under the current settings.
+    codec = _output["codec"]
+    path = Path(directory) / f"{name}{FORMATS[fmt]}"
+    return path.with_name(path.name + CSV_CODECS[codec]) if fmt == "csv" and codec else path
+
+
+def list_tables(directory: Path, fmt: str = "csv") -> List[str]:
+    flush_writes()
+    suffixes = [FORMATS[fmt]] + ([FORMATS[fmt] + s for s in CSV_CODECS.values()] if fmt == "csv" else [])
+    names = {p.name[: -len(s)] for p in Path(directory).iterdir() for s in suffixes if p.is_file() and p.name.endswith(s)}
+    return sorted(names)
+
+
+@contextmanager
+def compressed_output(codec: Optional[str], level: Optional[int] = None):
+    """Compress every table written inside the block with ``codec``.
+
+    CSVs become .csv.gz/.csv.zst, parquet and feather use the codec
+    internally. Writes are handed to a background thread so compressing one
+    table overlaps with computing the next; readers of a table wait for its
+    pending write.
+    """
+    global _writer
+    if not codec:
+        yield
+        return
+    _output.update(codec=codec, level=level)
+    _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="compress")
+    try:
+        yield
+        flush_writes()
+    finally:
+        _writer.shutdown(wait=True)
+        _writer = None
+        _pending.clear()
+        _output.update(codec=None, level=None)
+
+
+def compression() -> Tuple[Optional[str], Optional[int]]:
+    """Codec and level of the enclosing ``compressed_output`` block."""
+    return _output["codec"], _output["level"]
+
+
+def wait_for(directory: Path, name: str):
+    with _pending_lock:
+        future = _pending.pop((str(directory), name), None)
+    if future is not None:
+        future.result()
+
+
+def flush_writes():
+    with _pending_lock:
+        futures = list(_pending.values())
+        _pending.clear()
+    for future in futures:
+        future.result()
+
+
+def _background(directory: Path, name: str, job):
+    if _writer is None:
+        job()
+        return
+    wait_for(directory, name)
+    with _pending_lock:
+        _pending[(str(directory), name)] = _writer.submit(job)
+
+
+def _csv_compression(codec: Optional[str], level: Optional[int]):
+    if not codec:
+        return None
+    if codec == "gzip":
+        return {"method": "gzip", "compresslevel": 6 if level is None else level}
+    return {"method": "zstd"} if level is None else {"method": "zstd", "level": level}
+
+
+def _open_csv_sink(path: Path, codec: Optional[str], level: Optional[int], mode: str = "w"):
+    # Appending adds a new gzip member / zstd frame; readers decode across them.
+    if codec == "gzip":
+        return gzip.open(path, mode + "t", compresslevel=6 if level is None else level, newline="", encoding="utf-8")
+    if codec == "zstd":
+        import zstandard
+        cctx = zstandard.ZstdCompressor(level=3 if level is None else level)
+        return zstandard.open(path, mode + "t", cctx=cctx, newline="", encoding="utf-8")
+    return open(path, mode, newline="", encoding="utf-8")
+
+
+def _arrow_compression(fmt: str, codec: Optional[str]) -> Optional[str]:
+    if codec and fmt == "feather" and codec != "zstd":
+        raise ValueError("feather output only supports zstd compression")
+    return codec
+
+
+def write_table(df: pd.DataFrame, directory: Path, name: str, fmt: str = "csv", schema: Optional[Schema] = None) -> Path:
+    out = output_path(directory, name, fmt)
+    codec, level = _output["codec"], _output["level"]
+    # Copy-on-write keeps the caller free to modify df while it is written.
+    df = df.copy(deep=False)
+
+    def write():
+        with step("write", name, format=fmt, rows_in=len(df), compression=codec) as record:
+            data = apply_schema(df, schema) if schema else df
+            if fmt == "csv":
+                data.to_csv(out, index=False, compression=_csv_compression(codec, level))
+            elif fmt == "parquet":
+                kwargs = {"compression_level": level} if codec and level is not None else {}
+                data.to_parquet(out, index=False, compression=codec or "snappy", **kwargs)
+            else:
+                kwargs = {"compression": _arrow_compression(fmt, codec), "compression_level": level} if codec else {}
+                _arrow().feather.write_feather(data.reset_index(drop=True), out, **kwargs)
+            # A table is stored in one variant only, so readers never see a stale copy.
+            for stale in _variants(directory, name, fmt):
+                if stale != out:
+                    stale.unlink(missing_ok=True)
+            record["bytes_written"] = file_bytes(out)
+
+    _background(directory, name, write)
+    return out
+
+
+def append_table(df: pd.DataFrame, directory: Path, name: str) -> Optional[Path]:
+    """Append rows to a CSV table stored under the current codec.
+
+    Returns None (and writes nothing) when the table is stored in another
+    variant, so the caller rewrites it whole in the current one.
+    """
+    out = output_path(directory, name, "csv")
+    if table_path(directory, name, "csv") != out or not out.exists():
+        return None
+    codec, level = _output["codec"], _output["level"]
+    df = df.copy(deep=False)
+
+    def append():
+        with step("append", name, format="csv", rows_in=len(df), compression=codec) as record:
+            before = file_bytes(out)
+            header = pd.read_csv(out, nrows=0).columns
+            with _open_csv_sink(out, codec, level, "a") as sink:
+                df.reindex(columns=header).to_csv(sink, header=False, index=False)
+            record["bytes_written"] = file_bytes(out) - before
+
+    _background(directory, name, append)
+    return out
+
+
+def csv_source(path):
+    # Archive members are streamed out of the zip; compressed files are
+    # decompressed by pandas based on their suffix.
+    return path.open("rb") if isinstance(path, zipfile.Path) else nullcontext(path)
+
+
+def read_table(directory: Path, name: str, fmt: str = "csv", columns: Optional[Iterable[str]] = None, schema: Optional[Schema] = None) -> pd.DataFrame:
+    path = table_path(directory, name, fmt)
+    wanted = list(columns) if columns is not None else None
+    schema = schema or {}
+    with step("read", name, format=fmt, bytes_read=file_bytes(path)) as record:
+        if fmt == "csv":
+            dtypes = {c: t for c, t in schema.items() if not is_timestamp(t)}
+            usecols = (lambda c: c in wanted) if wanted is not None else None
+            with csv_source(path) as source:
+                df = pd.read_csv(source, dtype=dtypes, usecols=usecols)
+        else:
+            pa = _arrow()
+            # Both Arrow formats are opened memory-mapped and only the projected
+            # columns are materialised.
+            if fmt == "parquet":
+                source = pa.parquet.ParquetFile(path, memory_map=True)
+                names = source.schema_arrow.names
+                table = source.read(columns=[c for c in names if c in wanted] if wanted is not None else None)
+            else:
+                table = pa.feather.read_table(path, memory_map=True)
+                if wanted is not None:
+                    table = table.select([c for c in table.column_names if c in wanted])
+            df = table.to_pandas(split_blocks=True, self_destruct=True)
+        df = apply_schema(df, schema)
+        record["rows_out"] = len(df)
+    return df
+
+
+class TableWriter:
+    """Appends DataFrame chunks to a single staging/DW table in any format.
+
+    Under ``compressed_output`` chunks are compressed on the background
+    writer thread, in order, while the caller prepares the next chunk.
+    """
+
+    def __init__(self, directory: Path, name: str, fmt: str = "csv", schema: Optional[Schema] = None):
+        self.directory = directory
+        self.name = name
+        self.path = output_path(directory, name, fmt)
+        self.fmt = fmt
+        self.schema = schema
+        self.codec, self.level = _output["codec"], _output["level"]
+        self.rows = 0
+        self._writer = None
+        self._sink = None
+        self._arrow_schema = None
+        self._jobs: List[Future] = []
+
+    def write(self, df: pd.DataFrame):
+        df = df.copy(deep=False)
+
+        def job():
+            with step("write_chunk", self.name, format=self.fmt, rows_in=len(df)):
+                self._write(df)
+
+        if _writer is None:
+            job()
+        else:
+            self._jobs.append(_writer.submit(job))
+
+    def _write(self, df: pd.DataFrame):
+        if self.schema:
+            df = apply_schema(df, self.schema)
+        if self.fmt == "csv":
+            if self._sink is None:
+                self._sink = _open_csv_sink(self.path, self.codec, self.level)
+            df.to_csv(self._sink, index=False, header=not self.rows)
+        else:
+            pa = _arrow()
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._arrow_schema = table.schema
+                codec = _arrow_compression(self.fmt, self.codec)
+                if self.fmt == "parquet":
+                    self._writer = pa.parquet.ParquetWriter(self.path, table.schema, compression=codec or "snappy", compression_level=self.level if codec else None)
+                else:
+                    options = pa.ipc.IpcWriteOptions(compression=pa.Codec(codec, self.level) if codec else None)
+                    self._sink = pa.OSFile(str(self.path), "wb")
+                    self._writer = pa.ipc.new_file(self._sink, table.schema, options=options)
+            self._writer.write_table(table.cast(self._arrow_schema))
+        self.rows += len(df)
+
+    def close(self):
+        try:
+            for job in self._jobs:
+                job.result()
+        finally:
+            if self._writer is not None:
+                self._writer.close()
+            if self._sink is not None:
+                self._sink.close()
+        if self.rows:
+            for stale in _variants(self.directory, self.name, self.fmt):
+                if stale != self.path:
+                    stale.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
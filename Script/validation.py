@@ -0,0 +1,205 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+from storage import table_path, write_table
+
+QUARANTINE_DIR = "quarantine"
+REPORT_FILE = "_report.json"
+
+# Raw table -> its natural key; repeats after the first are duplicates.
+NATURAL_KEYS = {
+    "customer": "customer_id",
+    "product": "product_id",
+    "sales_order": "order_id",
+    "sales_order_item": "order_item_id",
+    "payment": "payment_id",
+    "shipment": "shipment_id",
+    "web_session": "session_id",
+    "nps_response": "nps_id",
+}
+
+# Raw table -> {column: parent table}; the value must be a valid parent's key.
+FOREIGN_KEYS = {
+    "sales_order": {"customer_id": "customer"},
+    "sales_order_item": {"order_id": "sales_order", "product_id": "product"},
+    "payment": {"order_id": "sales_order"},
+    "shipment": {"order_id": "sales_order"},
+}
+
+NON_NEGATIVE = {
+    "sales_order": ["total_amount"],
+    "sales_order_item": ["quantity", "unit_price", "discount_amount", "line_total"],
+    "payment": ["amount"],
+}
+
+LINE_TOTAL_TOLERANCE = 0.01
+
+_report_lock = threading.Lock()
+
+
+def rule_columns(name: str) -> List[str]:
+    columns = [NATURAL_KEYS[name]] if name in NATURAL_KEYS else []
+    columns += list(FOREIGN_KEYS.get(name, {})) + NON_NEGATIVE.get(name, [])
+    if name == "sales_order_item":
+        columns += ["quantity", "unit_price", "discount_amount", "line_total"]
+    if name == "shipment":
+        columns += ["shipped_at", "delivered_at"]
+    return list(dict.fromkeys(columns))
+
+
+def parents_of(name: str) -> List[str]:
+    return list(dict.fromkeys(FOREIGN_KEYS.get(name, {}).values()))
+
+
+def _numbers(df: pd.DataFrame, column: str) -> np.ndarray:
+    return pd.to_numeric(df[column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _keys(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """(mask of rows with a numeric key, those keys as int64)."""
+    ids = pd.to_numeric(values, errors="coerce")
+    present = ids.notna().to_numpy()
+    return present, ids[present].to_numpy(dtype="int64")
+
+
+class KeySet:
+    """Set of int64 keys kept as sorted blocks that merge geometrically.
+
+    A block is merged into the one before it while that one is no larger,
+    so every key takes part in O(log n) merges and a lookup binary-searches
+    O(log n) blocks. Adding a chunk and probing it cost time in the chunk's
+    size, not in the number of keys already held.
+    """
+
+    def __init__(self, keys: Optional[np.ndarray] = None):
+        self.blocks: List[np.ndarray] = []
+        if keys is not None:
+            self.add(keys)
+
+    def add(self, keys: np.ndarray):
+        block = np.unique(np.asarray(keys, dtype="int64"))
+        block = block[~self.contains(block)]
+        if not len(block):
+            return
+        while self.blocks and len(self.blocks[-1]) <= len(block):
+            block = np.union1d(self.blocks.pop(), block)
+        self.blocks.append(block)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        keys = np.asarray(keys, dtype="int64")
+        found = np.zeros(len(keys), dtype=bool)
+        for block in self.blocks:
+            pos = np.minimum(np.searchsorted(block, keys), len(block) - 1)
+            found |= block[pos] == keys
+        return found
+
+    def __len__(self) -> int:
+        return sum(len(block) for block in self.blocks)
+
+
+class Validator:
+    """Set-based quality checks for one raw table.
+
+    ``parents`` holds the natural keys of the already validated parent
+    tables. The validator can be applied to a whole table or chunk by chunk;
+    natural keys seen in earlier chunks count as duplicates.
+    """
+
+    def __init__(self, name: str, parents: Optional[Dict[str, Optional[KeySet]]] = None):
+        self.name = name
+        self.parents = parents or {}
+        self.seen = KeySet()
+        self.counts: Dict[str, int] = {}
+
+    def checks(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        failed: Dict[str, np.ndarray] = {}
+        key = NATURAL_KEYS.get(self.name)
+        if key in df.columns:
+            present, ids = _keys(df[key])
+            # Only this chunk's keys are probed against the earlier ones.
+            duplicate = np.zeros(len(df), dtype=bool)
+            duplicate[present] = pd.Series(ids).duplicated().to_numpy() | self.seen.contains(ids)
+            failed[f"duplicate_{key}"] = duplicate
+        for column, parent in FOREIGN_KEYS.get(self.name, {}).items():
+            if column in df.columns and self.parents.get(parent) is not None:
+                present, ids = _keys(df[column])
+                found = np.zeros(len(df), dtype=bool)
+                found[present] = self.parents[parent].contains(ids)
+                failed[f"orphan_{column}"] = ~found
+        for column in NON_NEGATIVE.get(self.name, []):
+            if column in df.columns:
+                failed[f"negative_{column}"] = _numbers(df, column) < 0
+        if self.name == "sales_order_item" and {"quantity", "unit_price", "line_total"} <= set(df.columns):
+            discount = np.nan_to_num(_numbers(df, "discount_amount")) if "discount_amount" in df.columns else 0.0
+            expected = _numbers(df, "quantity") * _numbers(df, "unit_price") - discount
+            failed["line_total_mismatch"] = np.abs(_numbers(df, "line_total") - expected) > LINE_TOTAL_TOLERANCE
+        if self.name == "shipment" and {"shipped_at", "delivered_at"} <= set(df.columns):
+            shipped = pd.to_datetime(df["shipped_at"], errors="coerce")
+            delivered = pd.to_datetime(df["delivered_at"], errors="coerce")
+            failed["delivered_before_shipped"] = (delivered < shipped).to_numpy()
+        return failed
+
+    def apply(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Split ``df`` into (valid rows, quarantined rows with failed_checks)."""
+        if df.empty:
+            return df, df.iloc[0:0]
+        failed = self.checks(df)
+        key = NATURAL_KEYS.get(self.name)
+        if key in df.columns:
+            self.seen.add(_keys(df[key])[1])
+        if not failed:
+            return df, df.iloc[0:0]
+        names = list(failed)
+        matrix = np.column_stack([failed[n] for n in names])
+        bad = matrix.any(axis=1)
+        for i, name in enumerate(names):
+            self.counts[name] = self.counts.get(name, 0) + int(matrix[:, i].sum())
+        if not bad.any():
+            return df, df.iloc[0:0]
+        quarantined = df[bad].copy()
+        # "check_a;check_b" per failing row, built column-wise.
+        labels = np.where(matrix[bad], np.array(names, dtype=object), "")
+        quarantined["failed_checks"] = [";".join(filter(None, row)) for row in labels]
+        return df[~bad].reset_index(drop=True), quarantined
+
+    @property
+    def quarantined(self) -> int:
+        return sum(self.counts.values())
+
+
+def valid_keys(name: str, df: pd.DataFrame) -> Optional[KeySet]:
+    # A missing parent table cannot be checked against, rather than orphaning every row.
+    key = NATURAL_KEYS[name]
+    if df is None or df.empty or key not in df.columns:
+        return None
+    return KeySet(_keys(df[key])[1])
+
+
+def quarantine(name: str, rejected: Iterable[pd.DataFrame], counts: Dict[str, int], staging_dir: Path) -> int:
+    """Write the rejected rows of ``name`` and record its counts in the report."""
+    out_dir = Path(staging_dir) / QUARANTINE_DIR
+    rejected = [df for df in rejected if not df.empty]
+    bad = pd.concat(rejected, ignore_index=True) if rejected else pd.DataFrame()
+    if bad.empty:
+        if out_dir.exists():
+            table_path(out_dir, name, "csv").unlink(missing_ok=True)
+    else:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        write_table(bad, out_dir, name, "csv")
+        failed = ", ".join(f"{check}={n}" for check, n in counts.items() if n)
+        print(f"⚠️  Quarantined {len(bad)} {name} rows ({failed})")
+    with _report_lock:
+        path = out_dir / REPORT_FILE
+        report = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                report = json.load(f)
+        report[name] = {"quarantined": len(bad), **{check: n for check, n in counts.items() if n}}
+        out_dir.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    return len(bad)
@@ -0,0 +1,5 @@
+from pathlib import Path
+import sys
+
+# The pipeline modules are flat scripts that import their siblings directly.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "Script"))
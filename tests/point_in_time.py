@@ -0,0 +1,61 @@
+from pathlib import Path
+import shutil
+import pandas as pd
+
+REFERENCE_TABLES = ["channel", "province", "product_category", "product", "store"]
+
+
+def cut_raw(src: Path, dst: Path, at: str) -> Path:
+    """Write ``src`` raw CSVs as they looked at ``at``.
+
+    Later orders, sessions and responses do not exist yet; payments and
+    shipments of earlier orders lose the milestones reached after ``at``.
+    """
+    at = pd.Timestamp(at)
+    dst.mkdir(parents=True, exist_ok=True)
+    for name in REFERENCE_TABLES:
+        shutil.copyfile(src / f"{name}.csv", dst / f"{name}.csv")
+
+    def read(name: str) -> pd.DataFrame:
+        return pd.read_csv(src / f"{name}.csv")
+
+    def after(df: pd.DataFrame, column: str) -> pd.Series:
+        return pd.to_datetime(df[column]) > at
+
+    orders = read("sales_order")
+    orders = orders[~after(orders, "order_date")]
+    orders.to_csv(dst / "sales_order.csv", index=False)
+    items = read("sales_order_item")
+    items[items["order_id"].isin(orders["order_id"])].to_csv(dst / "sales_order_item.csv", index=False)
+
+    payments = read("payment")
+    payments = payments[payments["order_id"].isin(orders["order_id"])].copy()
+    unpaid = after(payments, "paid_at")
+    payments.loc[unpaid, ["paid_at", "transaction_ref"]] = None
+    payments.loc[unpaid, "status"] = "PENDING"
+    payments.to_csv(dst / "payment.csv", index=False)
+
+    shipments = read("shipment")
+    shipments = shipments[shipments["order_id"].isin(orders["order_id"])].copy()
+    unshipped, undelivered = after(shipments, "shipped_at"), after(shipments, "delivered_at")
+    shipments.loc[undelivered, "delivered_at"] = None
+    shipments.loc[undelivered, "status"] = "SHIPPED"
+    shipments.loc[unshipped, "shipped_at"] = None
+    shipments.loc[unshipped, "status"] = "READY"
+    shipments.to_csv(dst / "shipment.csv", index=False)
+
+    events = {"nps_response": "responded_at", "web_session": "started_at"}
+    referenced = set(orders["customer_id"])
+    for name, column in events.items():
+        if (src / f"{name}.csv").exists():
+            df = read(name)
+            df = df[~after(df, column)]
+            df.to_csv(dst / f"{name}.csv", index=False)
+            referenced |= set(df["customer_id"].dropna())
+
+    customers = read("customer")
+    customers[~after(customers, "created_at") | customers["customer_id"].isin(referenced)].to_csv(dst / "customer.csv", index=False)
+    addresses = read("address")
+    used = set(orders["billing_address_id"].dropna()) | set(orders["shipping_address_id"].dropna()) | set(read("store")["address_id"])
+    addresses[~after(addresses, "created_at") | addresses["address_id"].isin(used)].to_csv(dst / "address.csv", index=False)
+    return dst
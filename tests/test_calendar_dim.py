@@ -0,0 +1,43 @@
+import pandas as pd
+
+from calendar_dim import add_date_keys, build_calendar, date_key, easter_sundays
+
+
+def day(calendar: pd.DataFrame, value: str) -> pd.Series:
+    return calendar.set_index("date").loc[value]
+
+
+def test_calendar_covers_whole_years_with_yyyymmdd_keys():
+    calendar = build_calendar("2024-03-15", "2025-02-01")
+    assert len(calendar) == 366 + 365
+    assert calendar["date_key"].iloc[0] == 20240101
+    assert calendar["date_key"].iloc[-1] == 20251231
+    assert calendar["date_key"].is_monotonic_increasing
+
+
+def test_weekday_weekend_and_iso_week():
+    calendar = build_calendar("2024-01-01", "2024-12-31")
+    saturday = day(calendar, "2024-06-01")
+    assert saturday["day_name"] == "Sábado" and saturday["day_of_week"] == 6 and saturday["is_weekend"]
+    assert not day(calendar, "2024-06-03")["is_weekend"]
+    assert day(calendar, "2024-12-30")["iso_year"] == 2025 and day(calendar, "2024-12-30")["iso_week"] == 1
+
+
+def test_easter_based_and_movable_holidays():
+    assert list(easter_sundays([2024, 2025]).dt.strftime("%Y-%m-%d")) == ["2024-03-31", "2025-04-20"]
+    calendar = build_calendar("2024-01-01", "2025-12-31")
+    holidays = calendar[calendar["is_holiday"]].set_index("date")["holiday_name"]
+    assert holidays["2024-03-29"] == "Viernes Santo"
+    assert holidays["2024-02-12"] == "Carnaval" and holidays["2024-02-13"] == "Carnaval"
+    assert holidays["2024-07-09"] == "Día de la Independencia"
+    # Soberanía Nacional falls on a Wednesday in 2024 and a Thursday in 2025.
+    assert holidays["2024-11-18"] == "Día de la Soberanía Nacional" and "2024-11-20" not in holidays
+    assert holidays["2025-11-24"] == "Día de la Soberanía Nacional"
+    assert not day(calendar, "2024-06-04")["is_holiday"]
+
+
+def test_role_playing_date_keys():
+    df = add_date_keys(pd.DataFrame({"paid_at": ["2024-05-02 10:00:00", None], "order_date": ["2024-05-01", "2024-05-01"]}))
+    assert df["paid_date_key"].tolist()[0] == 20240502 and pd.isna(df["paid_date_key"].iloc[1])
+    assert df["order_date_key"].tolist() == [20240501, 20240501]
+    assert date_key(["2025-12-31"]).iloc[0] == 20251231
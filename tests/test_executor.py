@@ -0,0 +1,76 @@
+import contextlib
+import io
+import pandas as pd
+
+import Desnormalizador
+from build_cache import BuildCache
+from executor import Node, run_dag
+
+from test_incremental import RAW_DIR
+
+
+def pipeline(tmp_path, calls):
+    source = tmp_path / "source.csv"
+    upstream, downstream = tmp_path / "upstream.csv", tmp_path / "downstream.csv"
+
+    def build_upstream():
+        calls.append("upstream")
+        df = pd.read_csv(source)
+        df.to_csv(upstream, index=False)
+        return df
+
+    def build_downstream(df):
+        calls.append("downstream")
+        df.assign(total=df["x"].sum()).to_csv(downstream, index=False)
+
+    def load_upstream():
+        calls.append("load upstream")
+        return pd.read_csv(upstream)
+
+    return [
+        Node("upstream", build_upstream, sources=[source], outputs=[upstream], load=load_upstream),
+        Node("downstream", build_downstream, ["upstream"], outputs=[downstream]),
+    ]
+
+
+def test_fresh_upstream_is_loaded_not_rebuilt(tmp_path):
+    pd.DataFrame({"x": [1, 2]}).to_csv(tmp_path / "source.csv", index=False)
+    calls = []
+    run_dag(pipeline(tmp_path, calls), cache=BuildCache(tmp_path / "cache.json"))
+    assert calls == ["upstream", "downstream"]
+
+    written = (tmp_path / "upstream.csv").stat().st_mtime_ns
+    (tmp_path / "downstream.csv").unlink()
+    calls.clear()
+    run_dag(pipeline(tmp_path, calls), cache=BuildCache(tmp_path / "cache.json"))
+    assert calls == ["load upstream", "downstream"]
+    assert (tmp_path / "upstream.csv").stat().st_mtime_ns == written
+    assert pd.read_csv(tmp_path / "downstream.csv")["total"].tolist() == [3, 3]
+
+    calls.clear()
+    run_dag(pipeline(tmp_path, calls), cache=BuildCache(tmp_path / "cache.json"))
+    assert calls == []
+
+
+def test_changed_source_rebuilds_the_chain(tmp_path):
+    pd.DataFrame({"x": [1, 2]}).to_csv(tmp_path / "source.csv", index=False)
+    calls = []
+    run_dag(pipeline(tmp_path, calls), cache=BuildCache(tmp_path / "cache.json"))
+    pd.DataFrame({"x": [1, 2, 4]}).to_csv(tmp_path / "source.csv", index=False)
+    calls.clear()
+    run_dag(pipeline(tmp_path, calls), cache=BuildCache(tmp_path / "cache.json"))
+    assert calls == ["upstream", "downstream"]
+    assert pd.read_csv(tmp_path / "downstream.csv")["total"].tolist() == [7, 7, 7]
+
+
+def test_output_options_invalidate_the_cache(tmp_path):
+    def run(*flags) -> str:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            Desnormalizador.main(["--raw-dir", str(RAW_DIR), "--staging-dir", str(tmp_path), *flags])
+        return out.getvalue()
+
+    run("--compress", "gzip", "--compress-level", "1")
+    assert "Saved" not in run("--compress", "gzip", "--compress-level", "1")
+    # Same file names, different bytes: the level must still trigger a rebuild.
+    assert "Saved" in run("--compress", "gzip", "--compress-level", "9")
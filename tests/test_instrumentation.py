@@ -0,0 +1,30 @@
+import json
+import numpy as np
+
+import Desnormalizador
+from instrumentation import peak_rss_bytes, rss_bytes, run_manifest
+
+from test_incremental import RAW_DIR
+
+
+def records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_peak_rss_outlives_freed_memory(tmp_path):
+    with run_manifest(tmp_path / "m.jsonl", "test"):
+        block = np.ones(256 * 2**20, dtype="uint8")
+        del block
+    run = records(tmp_path / "m.jsonl")[-1]
+    assert run["kind"] == "run"
+    # The freed block no longer counts in the current RSS but still in the peak.
+    assert run["peak_rss_bytes"] - rss_bytes() > 128 * 2**20
+    assert peak_rss_bytes() >= run["peak_rss_bytes"]
+
+
+def test_streamed_reads_record_bytes_and_rows(tmp_path):
+    Desnormalizador.main(["--raw-dir", str(RAW_DIR), "--staging-dir", str(tmp_path), "--chunk-rows", "5000"])
+    reads = {r["name"]: r for r in records(tmp_path / "_manifest.jsonl") if r["kind"] == "read_chunks"}
+    assert reads["payment"]["bytes_read"] == (RAW_DIR / "payment.csv").stat().st_size
+    assert reads["payment"]["rows_out"] == 12000 and reads["payment"]["chunks"] == 3
+    assert 0 < reads["payment"]["read_s"] <= reads["payment"]["wall_s"]
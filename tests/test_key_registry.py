@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+from key_registry import KEYS_DIR, KeyRegistry
+
+
+def test_keys_survive_a_rebuild_in_any_order(tmp_path):
+    first = KeyRegistry.open(tmp_path, "order_id")
+    keys = first.assign(pd.Series([30, 10, 20, 10]))
+    assert keys.tolist() == [1, 2, 3, 2]
+    first.save()
+    assert (tmp_path / KEYS_DIR / "order_id.npz").exists()
+
+    again = KeyRegistry.open(tmp_path, "order_id")
+    keys = again.assign(pd.Series([20, 40, 30, 10]))
+    assert keys.tolist() == [3, 4, 1, 2]
+
+
+def test_lookup_leaves_unknown_and_missing_values_null(tmp_path):
+    registry = KeyRegistry.open(tmp_path, "payment_id")
+    registry.assign(pd.Series([5, 7]))
+    keys = registry.lookup(pd.Series([7.0, np.nan, 9.0]))
+    assert keys.tolist()[0] == 2
+    assert keys.isna().tolist() == [False, True, True]
+    assert len(registry) == 2
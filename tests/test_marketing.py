@@ -0,0 +1,73 @@
+import pandas as pd
+
+from marketing import attribute_orders, cohort_retention, rfm_scores
+
+WEEK = pd.Timedelta(days=7)
+
+
+def frame(rows, columns) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=columns)
+    for col in ["order_date", "started_at"]:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    return df
+
+
+ORDERS = frame([
+    (1, 1, "2025-01-10 12:00", 100.0),
+    (2, 2, "2025-02-01 00:00", 80.0),
+    (3, 4, "2025-03-08 00:00", 60.0),
+], ["order_key", "customer", "order_date", "total_amount"])
+
+SESSIONS = frame([
+    (10, 1, "2025-01-01 00:00", "seo", "web"),
+    (11, 1, "2025-01-05 12:00", "google", "web"),
+    (12, 1, "2025-01-10 10:00", "email", "app"),
+    (13, 1, "2025-01-10 13:00", "social", "app"),
+    (14, 3, "2025-01-09 00:00", "google", "web"),
+    (15, 4, "2025-03-01 00:00", "email", "web"),
+], ["session_key", "customer", "started_at", "source", "device"])
+
+
+def credited(attribution: pd.DataFrame, model: str, order_key: int) -> dict:
+    rows = attribution[(attribution["model"] == model) & (attribution["order_key"] == order_key)]
+    return dict(zip(rows["session_key"], rows["attributed_revenue"]))
+
+
+def test_sessions_are_credited_inside_the_lookback_window():
+    attribution = attribute_orders(ORDERS, SESSIONS, WEEK)
+
+    assert credited(attribution, "last_touch", 1) == {12: 100.0}
+    assert credited(attribution, "first_touch", 1) == {11: 100.0}
+    assert credited(attribution, "linear", 1) == {11: 50.0, 12: 50.0}
+    # A session exactly one lookback before the order still counts.
+    assert credited(attribution, "last_touch", 3) == {15: 60.0}
+    # Customer 2 has no sessions; customer 3's session belongs to nobody's order.
+    assert 2 not in set(attribution["order_key"]) and 14 not in set(attribution["session_key"])
+    last = attribution[(attribution["model"] == "last_touch") & (attribution["order_key"] == 1)]
+    assert last["hours_before_order"].tolist() == [2.0]
+    assert attribution.groupby(["model", "order_key"], observed=True)["credit"].sum().round(6).eq(1).all()
+
+
+def test_rfm_scores_rank_customers_into_quintiles():
+    rows = [(10 * c + i, c, f"2025-0{c}-0{i + 1}", 10.0 * c) for c in range(1, 6) for i in range(c)]
+    rfm = rfm_scores(frame(rows, ["order_key", "customer", "order_date", "total_amount"]), pd.Timestamp("2025-07-01")).set_index("customer")
+
+    assert rfm.loc[5, ["frequency", "monetary", "recency_days"]].tolist() == [5, 250.0, 57]
+    assert rfm["rfm_score"].to_dict() == {1: "111", 2: "222", 3: "333", 4: "444", 5: "555"}
+    assert rfm.loc[5, "segment"] == "champions" and rfm.loc[1, "segment"] == "hibernating"
+
+
+def test_cohort_retention_follows_first_order_month():
+    orders = frame([
+        (1, "a", "2025-01-03"), (2, "a", "2025-02-10"), (3, "a", "2025-02-11"),
+        (4, "b", "2025-01-20"), (5, "b", "2025-03-05"),
+        (6, "c", "2025-02-14"),
+    ], ["order_key", "customer", "order_date"])
+    cohorts = cohort_retention(orders)
+
+    january = cohorts[cohorts["cohort_month"] == 202501].set_index("months_since_first")
+    assert january["customers"].to_dict() == {0: 2, 1: 1, 2: 1}
+    assert january["retention"].to_dict() == {0: 1.0, 1: 0.5, 2: 0.5}
+    february = cohorts[cohorts["cohort_month"] == 202502]
+    assert february[["months_since_first", "customers", "cohort_size"]].values.tolist() == [[0, 1, 1]]
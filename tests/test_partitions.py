@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+import Desnormalizador
+import DimFacts
+from partitions import is_partitioned, list_partitions, read_fact, upsert_partitioned, write_partitioned
+from storage import read_table, write_table
+
+from test_incremental import RAW_DIR
+
+
+def payments(rows) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["payment_key", "paid_date_key", "amount"]).astype({"paid_date_key": "Int64"})
+
+
+def test_write_upsert_round_trip(tmp_path):
+    write_partitioned(payments([(1, 20250105, 10.0), (2, 20250210, 20.0), (3, None, 30.0)]), tmp_path, "fact_payments")
+    assert list_partitions(tmp_path, "fact_payments") == [(None, None), (2025, 1), (2025, 2)]
+
+    # Payment 3 is paid in March, payment 1 is corrected, payment 4 is new.
+    touched = upsert_partitioned(payments([(3, 20250301, 30.0), (1, 20250105, 11.0), (4, None, 40.0)]), tmp_path, "fact_payments", "payment_key")
+    assert touched == 3
+    fact = read_fact(tmp_path, "fact_payments").sort_values("payment_key")
+    assert fact["amount"].tolist() == [11.0, 20.0, 30.0, 40.0]
+    assert fact["paid_date_key"].tolist()[:3] == [20250105, 20250210, 20250301]
+    assert list_partitions(tmp_path, "fact_payments") == [(None, None), (2025, 1), (2025, 2), (2025, 3)]
+
+
+def test_read_fact_prunes_by_date(tmp_path):
+    write_partitioned(payments([(1, 20250105, 10.0), (2, 20250210, 20.0), (3, 20250228, 25.0), (4, 20250301, 30.0), (5, None, 50.0)]), tmp_path, "fact_payments")
+
+    assert read_fact(tmp_path, "fact_payments", start="2025-02-01", end="2025-02-28")["payment_key"].tolist() == [2, 3]
+    assert read_fact(tmp_path, "fact_payments", start="2025-02-15")["payment_key"].tolist() == [3, 4]
+    assert sorted(read_fact(tmp_path, "fact_payments", end="2025-01-31", undated=True)["payment_key"]) == [1, 5]
+    assert len(read_fact(tmp_path, "fact_payments")) == 5
+
+
+def test_upsert_converts_a_monolithic_fact_first(tmp_path):
+    write_table(payments([(1, 20250105, 10.0), (2, None, 20.0)]), tmp_path, "fact_payments")
+    upsert_partitioned(payments([(3, 20250210, 30.0)]), tmp_path, "fact_payments", "payment_key")
+
+    assert is_partitioned(tmp_path, "fact_payments")
+    assert sorted(read_fact(tmp_path, "fact_payments")["payment_key"]) == [1, 2, 3]
+
+
+def test_switching_to_partitioned_nightly_runs_keeps_history(tmp_path):
+    staging, dw = tmp_path / "STAGING", tmp_path / "DW"
+    Desnormalizador.main(["--raw-dir", str(RAW_DIR), "--staging-dir", str(staging)])
+    DimFacts.main(["--staging-dir", str(staging), "--dw-dir", str(dw)])
+    before = {name: len(read_table(dw, name)) for name in ["fact_sales_order", "fact_payments", "fact_nps"]}
+
+    DimFacts.main(["--staging-dir", str(staging), "--dw-dir", str(dw), "--incremental", "--partition-facts"])
+    assert {name: len(read_fact(dw, name)) for name in before} == before
+    assert all(is_partitioned(dw, name) for name in before)
+
+    # Going back to monolithic files needs a full rebuild.
+    with pytest.raises(RuntimeError, match="built partitioned"):
+        DimFacts.build_dims_and_facts(staging, dw, incremental=True, force=True)
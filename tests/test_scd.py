@@ -0,0 +1,37 @@
+import pandas as pd
+
+from scd import BEGINNING, resolve_versions, scd2_merge
+
+JUNE = pd.Timestamp("2025-06-01")
+
+
+def customers(**emails) -> pd.DataFrame:
+    return pd.DataFrame({"customer_natural_key": [int(k[1:]) for k in emails], "email": list(emails.values())})
+
+
+def test_a_changed_attribute_closes_the_version_and_opens_a_new_one():
+    first = scd2_merge(customers(c1="a@x", c2="b@x"), None, "customer_key", "customer_natural_key", BEGINNING)
+    dim = scd2_merge(customers(c1="a@y", c2="b@x", c3="c@x"), first, "customer_key", "customer_natural_key", JUNE)
+
+    one = dim[dim["customer_natural_key"] == 1].sort_values("customer_key")
+    assert one["email"].tolist() == ["a@x", "a@y"]
+    assert one["is_current"].tolist() == [False, True]
+    assert one["valid_to"].iloc[0] == JUNE and one["valid_from"].iloc[1] == JUNE
+    assert pd.isna(one["valid_to"].iloc[1])
+    # Unchanged members keep their single version; new ones get a first version.
+    assert dim.groupby("customer_natural_key").size().to_dict() == {1: 2, 2: 1, 3: 1}
+    assert dim["customer_key"].is_unique
+
+
+def test_unchanged_snapshot_adds_no_versions():
+    first = scd2_merge(customers(c1="a@x"), None, "customer_key", "customer_natural_key", BEGINNING)
+    again = scd2_merge(customers(c1="a@x"), first, "customer_key", "customer_natural_key", JUNE)
+    assert len(again) == 1 and bool(again["is_current"].iloc[0])
+
+
+def test_events_resolve_to_the_version_valid_at_the_time():
+    first = scd2_merge(customers(c1="a@x"), None, "customer_key", "customer_natural_key", BEGINNING)
+    dim = scd2_merge(customers(c1="a@y"), first, "customer_key", "customer_natural_key", JUNE)
+    at = pd.Series(pd.to_datetime(["2025-01-10", "2025-07-01", None]))
+    keys = resolve_versions(pd.Series([1, 1, 1]), at, dim, "customer_key", "customer_natural_key")
+    assert keys.tolist() == [1, 2, 2]
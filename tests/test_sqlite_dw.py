@@ -0,0 +1,55 @@
+import sqlite3
+import pandas as pd
+import pytest
+
+from sqlite_dw import export_sqlite
+from storage import write_table
+
+
+@pytest.fixture
+def dw(tmp_path):
+    write_table(pd.DataFrame({"customer_key": [1, 2, 3], "customer_natural_key": [10, 20, 30], "email": ["a@x", "b@x", "c@x"]}), tmp_path, "dim_customer")
+    write_table(pd.DataFrame({"date_key": [20250101, 20250102], "date": ["2025-01-01", "2025-01-02"], "is_weekend": [False, False]}), tmp_path, "dim_date")
+    orders = pd.DataFrame({
+        "order_key": range(1, 201),
+        "customer_key": pd.array([1, 2, 3, None] * 50, dtype="Int64"),
+        "order_date_key": [20250101, 20250102] * 100,
+        "total_amount": [10.5] * 200,
+    })
+    write_table(orders, tmp_path, "fact_sales_order")
+    write_table(pd.DataFrame({"order_date_key": [20250101, 20250102], "orders": [100, 100]}), tmp_path, "agg_daily_sales")
+    path = export_sqlite(tmp_path)
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+def columns(conn, table):
+    return {row[1]: (row[2], row[5]) for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_column_types_and_primary_keys(dw):
+    assert columns(dw, "fact_sales_order") == {
+        "order_key": ("INTEGER", 1),
+        "customer_key": ("INTEGER", 0),
+        "order_date_key": ("INTEGER", 0),
+        "total_amount": ("REAL", 0),
+    }
+    assert columns(dw, "dim_customer")["customer_key"] == ("INTEGER", 1)
+    assert columns(dw, "dim_customer")["email"] == ("TEXT", 0)
+    assert all(pk == 0 for _, pk in columns(dw, "agg_daily_sales").values())
+    references = {row[3]: row[2] for row in dw.execute("PRAGMA foreign_key_list(fact_sales_order)")}
+    assert references == {"customer_key": "dim_customer", "order_date_key": "dim_date"}
+
+
+def test_fact_keys_are_indexed(dw):
+    indexes = {row[1] for row in dw.execute("PRAGMA index_list(fact_sales_order)")}
+    assert {"ix_fact_sales_order_customer_key", "ix_fact_sales_order_order_date_key"} <= indexes
+    plan = " ".join(row[3] for row in dw.execute("EXPLAIN QUERY PLAN SELECT total_amount FROM fact_sales_order WHERE customer_key = 2"))
+    assert "ix_fact_sales_order_customer_key" in plan
+    assert dw.execute("SELECT count(*) FROM fact_sales_order WHERE customer_key IS NULL").fetchone() == (50,)
+
+
+def test_star_views_join_the_dimensions(dw):
+    rows = dw.execute("SELECT order_key, customer_email, order_date_date FROM v_sales_order WHERE order_key <= 4 ORDER BY order_key").fetchall()
+    assert rows == [(1, "a@x", "2025-01-01"), (2, "b@x", "2025-01-02"), (3, "c@x", "2025-01-01"), (4, None, "2025-01-02")]
@@ -0,0 +1,52 @@
+import pandas as pd
+
+from incremental import upsert_table
+from storage import TableWriter, compressed_output, read_table, write_table
+
+
+def stored(directory):
+    return sorted(p.name for p in directory.iterdir())
+
+
+def test_appended_rows_keep_the_run_codec(tmp_path):
+    with compressed_output("gzip"):
+        write_table(pd.DataFrame({"id": [1, 2], "v": ["a", "b"]}), tmp_path, "t")
+        upsert_table(pd.DataFrame({"id": [3], "v": ["c"]}), tmp_path, "t", "id")
+    assert stored(tmp_path) == ["t.csv.gz"]
+    assert read_table(tmp_path, "t")["id"].tolist() == [1, 2, 3]
+
+
+def test_a_table_in_another_codec_is_rewritten_not_appended(tmp_path):
+    write_table(pd.DataFrame({"id": [1, 2], "v": ["a", "b"]}), tmp_path, "t")
+    with compressed_output("zstd"):
+        upsert_table(pd.DataFrame({"id": [3], "v": ["c"]}), tmp_path, "t", "id")
+    assert stored(tmp_path) == ["t.csv.zst"]
+    with compressed_output("zstd"):
+        upsert_table(pd.DataFrame({"id": [2, 4], "v": ["B", "d"]}), tmp_path, "t", "id")
+    upsert_table(pd.DataFrame({"id": [5], "v": ["e"]}), tmp_path, "t", "id")
+    assert stored(tmp_path) == ["t.csv"]
+    df = read_table(tmp_path, "t")
+    assert df["id"].tolist() == [1, 2, 3, 4, 5] and df["v"].tolist() == ["a", "B", "c", "d", "e"]
+
+
+SCHEMA = {"id": "int64", "ts": "datetime64[ns]"}
+
+
+def stamps(ids, values) -> pd.DataFrame:
+    return pd.DataFrame({"id": ids, "ts": pd.to_datetime(values)})
+
+
+def test_midnight_timestamps_survive_upserts_and_appends(tmp_path):
+    # The second and third writes hold only midnights, which pandas writes as bare dates.
+    upsert_table(stamps([1], ["2024-01-01 10:00:00"]), tmp_path, "t", "id", schema=SCHEMA)
+    upsert_table(stamps([2], ["2024-01-02 00:00:00"]), tmp_path, "t", "id", schema=SCHEMA)
+    upsert_table(stamps([1, 3], ["2024-01-03 00:00:00", "2024-01-04 00:00:00"]), tmp_path, "t", "id", schema=SCHEMA)
+    df = read_table(tmp_path, "t", schema=SCHEMA)
+    assert df["ts"].tolist() == [pd.Timestamp("2024-01-03"), pd.Timestamp("2024-01-02"), pd.Timestamp("2024-01-04")]
+
+
+def test_midnight_timestamps_survive_streamed_chunks(tmp_path):
+    with TableWriter(tmp_path, "t", "csv", SCHEMA) as writer:
+        writer.write(stamps([1], ["2024-01-01 10:00:00"]))
+        writer.write(stamps([2], ["2024-01-02 00:00:00"]))
+    assert read_table(tmp_path, "t", schema=SCHEMA)["ts"].notna().all()
@@ -0,0 +1,30 @@
+import shutil
+import pandas as pd
+
+import Desnormalizador
+from storage import read_table
+from validation import QUARANTINE_DIR
+
+from test_incremental import RAW_DIR
+
+TABLES = ["stg_sales_order", "stg_sales_order_item", "stg_payment", "stg_shipment", "stg_nps_response"]
+
+
+def test_streamed_staging_matches_whole_tables(tmp_path):
+    raw = tmp_path / "raw"
+    shutil.copytree(RAW_DIR, raw)
+    # An order that fails validation and a payment that points at it.
+    orders = pd.read_csv(raw / "sales_order.csv")
+    orders.loc[orders.index[3], "total_amount"] = -1
+    orders.to_csv(raw / "sales_order.csv", index=False)
+
+    Desnormalizador.main(["--raw-dir", str(raw), "--staging-dir", str(tmp_path / "whole")])
+    Desnormalizador.main(["--raw-dir", str(raw), "--staging-dir", str(tmp_path / "chunks"), "--chunk-rows", "700", "--workers", "2"])
+
+    for name in TABLES:
+        pd.testing.assert_frame_equal(read_table(tmp_path / "chunks", name), read_table(tmp_path / "whole", name))
+    bad_order = orders.loc[orders.index[3], "order_id"]
+    for work in ["whole", "chunks"]:
+        quarantined = read_table(tmp_path / work / QUARANTINE_DIR, "payment")
+        assert bad_order in quarantined["order_id"].tolist()
+        assert set(quarantined["failed_checks"]) == {"orphan_order_id"}
@@ -0,0 +1,54 @@
+import json
+import numpy as np
+import pandas as pd
+
+from storage import read_table
+from validation import QUARANTINE_DIR, REPORT_FILE, KeySet, Validator, quarantine, valid_keys
+
+
+def test_key_set_matches_a_python_set():
+    rng = np.random.default_rng(7)
+    keys, expected = KeySet(), set()
+    for _ in range(50):
+        chunk = rng.integers(0, 5_000, size=int(rng.integers(1, 200)))
+        probe = rng.integers(0, 5_000, size=100)
+        assert keys.contains(probe).tolist() == [int(k) in expected for k in probe]
+        keys.add(chunk)
+        expected.update(chunk.tolist())
+    assert len(keys) == len(expected)
+    # Geometric merging keeps the block count logarithmic.
+    assert len(keys.blocks) <= int(np.log2(len(expected))) + 1
+
+
+def test_bad_rows_are_quarantined_with_their_checks(tmp_path):
+    orders = pd.DataFrame({"order_id": [1, 2]})
+    items = pd.DataFrame({
+        "order_item_id": [10, 11, 12, 13],
+        "order_id": [1, 9, 2, 2],
+        "product_id": [1, 1, 1, 1],
+        "quantity": [2, 1, -1, 1],
+        "unit_price": [5.0, 5.0, 5.0, 5.0],
+        "discount_amount": [0.0, 0.0, 0.0, 0.0],
+        "line_total": [10.0, 5.0, -5.0, 7.0],
+    })
+    validator = Validator("sales_order_item", {"sales_order": valid_keys("sales_order", orders)})
+    good, bad = validator.apply(items)
+
+    assert good["order_item_id"].tolist() == [10]
+    assert bad.set_index("order_item_id")["failed_checks"].to_dict() == {11: "orphan_order_id", 12: "negative_quantity;negative_line_total", 13: "line_total_mismatch"}
+
+    assert quarantine("sales_order_item", [bad], validator.counts, tmp_path) == 3
+    assert read_table(tmp_path / QUARANTINE_DIR, "sales_order_item")["order_item_id"].tolist() == [11, 12, 13]
+    report = json.loads((tmp_path / QUARANTINE_DIR / REPORT_FILE).read_text())
+    assert report["sales_order_item"] == {"quarantined": 3, "orphan_order_id": 1, "negative_quantity": 1, "negative_line_total": 1, "line_total_mismatch": 1}
+
+
+def test_duplicates_are_caught_across_chunks():
+    validator = Validator("payment")
+    first, _ = validator.apply(pd.DataFrame({"payment_id": [1, 2, 3], "amount": [1.0, 1.0, 1.0]}))
+    second, bad = validator.apply(pd.DataFrame({"payment_id": [4, 2, 4, None], "amount": [1.0, 1.0, 1.0, 1.0]}))
+
+    assert first["payment_id"].tolist() == [1, 2, 3]
+    assert second["payment_id"].tolist()[:1] == [4] and len(second) == 2
+    assert bad["payment_id"].tolist() == [2, 4]
+    assert validator.counts == {"duplicate_payment_id": 2, "negative_amount": 0}